@@ -0,0 +1,35 @@
+import random
+
+
+RECONNECT_BASE_DELAY = 1
+RECONNECT_MAX_DELAY = 120
+RECONNECT_FACTOR = 2
+# seconds over which sockets spread their reaction to a server RECONNECT notice.
+RECONNECT_NOTICE_SPREAD = 5
+
+
+class Backoff():
+    """Exponential backoff with jitter for reconnection attempts.
+
+    The delay doubles with every attempt up to `maximum`, and half of it is randomised so
+    sockets that lost their connections at the same moment do not retry in lockstep."""
+    __slots__ = ("base", "maximum", "factor", "attempts")
+
+    def __init__(self, base: float = RECONNECT_BASE_DELAY, maximum: float = RECONNECT_MAX_DELAY, factor: float = RECONNECT_FACTOR):
+        self.base = base
+        self.maximum = maximum
+        self.factor = factor
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        """The number of seconds to wait before the next attempt."""
+        delay = min(self.maximum, self.base * self.factor ** self.attempts)
+        self.attempts += 1
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self):
+        """Start over from `base`, called once a connection has proved to work."""
+        self.attempts = 0
+
+    def __repr__(self):
+        return f"[Backoff]: {self.attempts} attempt(s) (base: {self.base}s, max: {self.maximum}s)"
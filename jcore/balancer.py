@@ -0,0 +1,154 @@
+import time
+
+
+# a socket sheds channels once its message rate is above `load_ratio * HIGH_WATERMARK`.
+HIGH_WATERMARK = 1.2
+# channels are only moved onto a socket while its rate stays below `load_ratio * FILL_WATERMARK`.
+FILL_WATERMARK = 0.8
+# a socket is emptied into the others once its message rate is below `load_ratio * LOW_WATERMARK`.
+LOW_WATERMARK = 0.2
+# share of `max_connections` that the balancer fills a socket up to, leaving room for joins.
+CAPACITY_RATIO = 0.9
+# seconds a migrated channel is left where it is before it can be moved again.
+MIGRATION_COOLDOWN = 300
+# the most channels moved in a single balancing pass.
+MAX_MIGRATIONS = 10
+
+
+class NewSocket():
+    """Placeholder target for channels that do not fit on any of the existing sockets."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"[NewSocket]: {id(self):x}"
+
+
+class Migration():
+    """A channel to be moved from the socket it is joined on to another socket."""
+    __slots__ = ("channel", "source", "target", "rate")
+
+    def __init__(self, channel: str, source, target, rate: float):
+        self.channel = channel
+        self.source = source
+        self.target = target
+        self.rate = rate
+
+    def __repr__(self):
+        return f"[Migration]: {self.channel} ({self.rate:.2f}/s) {self.source} -> {self.target}"
+
+
+class Rebalancer():
+    """Plans the moves that keep the message rate of every socket near `load_ratio`.
+
+    Assigning channels to sockets is treated as bin packing: each socket is a bin holding at
+    most `max_connections * CAPACITY_RATIO` channels and `load_ratio` messages per second.
+    Overloaded sockets shed their busiest channels onto the fullest socket they still fit on
+    (best fit), or onto a new socket, and nearly idle sockets are emptied into the others so
+    they can be closed.
+
+    The watermarks leave a band around `load_ratio` in which nothing moves, and migrated
+    channels stay put for `MIGRATION_COOLDOWN` seconds, so channels near the limit do not
+    flap between sockets."""
+    __cooldowns: dict
+
+    def __init__(self, load_ratio: float, max_connections: int, cooldown: float = MIGRATION_COOLDOWN, max_migrations: int = MAX_MIGRATIONS):
+        self.load_ratio = load_ratio
+        self.capacity = max(1, int(max_connections * CAPACITY_RATIO))
+        self.cooldown = cooldown
+        self.max_migrations = max_migrations
+        self.__cooldowns = {}
+
+    def migrated(self, channel: str):
+        """Record that a channel has been moved, starting its cooldown."""
+        self.__cooldowns[channel] = time.monotonic() + self.cooldown
+
+    def is_cooling_down(self, channel: str) -> bool:
+        until = self.__cooldowns.get(channel)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self.__cooldowns[channel]
+            return False
+        return True
+
+    def plan(self, loads: dict, pinned: set = frozenset()) -> tuple:
+        """Plan the migrations for a balancing pass.
+
+        `loads` maps each socket to a dict of its channels and their message rates, channels in
+        `pinned` are never moved. Returns a list of `Migration`, where the target is either one of
+        the sockets or a `NewSocket` placeholder, and the list of sockets that are left empty once
+        the migrations are done and can be closed."""
+        high = self.load_ratio * HIGH_WATERMARK
+        fill = self.load_ratio * FILL_WATERMARK
+        low = self.load_ratio * LOW_WATERMARK
+        load = {socket: sum(rates.values()) for socket, rates in loads.items()}
+        count = {socket: len(rates) for socket, rates in loads.items()}
+        migrations = []
+        touched = set()
+        retired = []
+
+        def movable(socket) -> list:
+            return sorted(
+                ((rate, channel) for channel, rate in loads[socket].items() if channel not in pinned and not self.is_cooling_down(channel)),
+                reverse=True)
+
+        def best_fit(rate: float, excluded) -> object:
+            best = None
+            for target in load:
+                if target in excluded or count[target] >= self.capacity or load[target] + rate > fill:
+                    continue
+                if best is None or load[target] > load[best]:
+                    best = target
+            return best
+
+        def move(channel: str, source, target, rate: float):
+            migrations.append(Migration(channel, source, target, rate))
+            load[source] -= rate
+            count[source] -= 1
+            load[target] = load.get(target, 0) + rate
+            count[target] = count.get(target, 0) + 1
+            touched.add(source)
+            touched.add(target)
+
+        # shed the busiest channels of overloaded sockets, heaviest socket first.
+        for socket in sorted(loads, key=load.get, reverse=True):
+            if load[socket] <= high:
+                break
+            for rate, channel in movable(socket):
+                if load[socket] <= self.load_ratio or count[socket] <= 1 or rate == 0 or len(migrations) >= self.max_migrations:
+                    break
+                target = best_fit(rate, (socket, *retired))
+                if target is None:
+                    target = NewSocket()
+                move(channel, socket, target, rate)
+
+        # empty nearly idle sockets into the others, quietest socket first.
+        for socket in sorted(loads, key=load.get):
+            if load[socket] >= low:
+                break
+            if socket in touched or len(loads[socket]) != len(movable(socket)):
+                continue
+            channels = sorted(((rate, channel) for channel, rate in loads[socket].items()), reverse=True)
+            if len(migrations) + len(channels) > self.max_migrations:
+                continue
+            planned = []
+            for rate, channel in channels:
+                target = best_fit(rate, (socket, *retired))
+                if target is None:
+                    break
+                planned.append((channel, target, rate))
+                load[target] += rate
+                count[target] += 1
+            else:
+                for channel, target, rate in planned:
+                    load[target] -= rate
+                    count[target] -= 1
+                    move(channel, socket, target, rate)
+                retired.append(socket)
+                continue
+            # not every channel fits elsewhere, undo the tentative moves and keep the socket.
+            for channel, target, rate in planned:
+                load[target] -= rate
+                count[target] -= 1
+
+        return migrations, retired
@@ -2,17 +2,29 @@ import asyncio
 from importlib import util
 from jcore.helpers.settings import Settings
 from jcore.message import *
+from jcore.extensions import Module, Command, Periodic
 import jcore.exceptions
+import jcore.balancer
+import jcore.dedup
+import jcore.dispatch
 import jcore.jsocket
+import jcore.ratelimit
+import jcore.scheduler
+import jcore.transport
 import jcore
 import logging
 import os
 import sys
 import traceback
+import types
 
 INTERVAL = 0.001
 INTERVAL_LOAD_BALANCE = 20
 INTERVAL_INACTIVE_CHANNELS = 120
+INTERVAL_HEARTBEAT = 20
+# seconds the messages of a migrated channel are still only passed on from its new socket after it 
+# has been parted from the old one, covering the lines already in flight on the old connection.
+MIGRATION_GRACE = 5
 
 
 log = logging.getLogger(__name__)
@@ -29,14 +41,38 @@ log = logging.getLogger(__name__)
 
 class Client():
 
-    def __init__(self, channel:str = None, channels:list = None, max_connections: int = 50, command_activator: str = "!", load_ratio:float = 3):
+    def __init__(self, channel:str = None, channels:list = None, max_connections: int = 50, command_activator: str = "!", load_ratio:float = 3, lazy_messages: bool = False, yield_every_lines: int = jcore.transport.YIELD_EVERY_LINES, yield_every_us: int = jcore.transport.YIELD_EVERY_US, transport = "stream", dispatch_policy: str = jcore.dispatch.POLICY_LINE, max_concurrency: int = jcore.dispatch.DEFAULT_MAX_CONCURRENCY, verified_bot: bool = False, dedup_window: float = jcore.dedup.DEDUP_WINDOW, max_queue_size: int = jcore.dispatch.DEFAULT_QUEUE_SIZE, event_policy: dict = None):
         log.info(f"Starting new connection with: max connections per socket `{max_connections}` | command activator set to `{command_activator}` | load balance ratio set to `{load_ratio}`")
+        # `transport` names one of the built in transports, or is a `Transport` subclass (or any 
+        # callable taking the socket and returning a transport) to open the connections with.
+        if isinstance(transport, str):
+            if transport not in jcore.transport.TRANSPORTS:
+                raise jcore.exceptions.ClientException(f"Unknown transport `{transport}`, expected one of: {', '.join(jcore.transport.TRANSPORTS)}")
+            transport = jcore.transport.TRANSPORTS[transport]
+        if dispatch_policy not in jcore.dispatch.POLICIES:
+            raise jcore.exceptions.ClientException(f"Unknown dispatch policy `{dispatch_policy}`, expected one of: {', '.join(jcore.dispatch.POLICIES)}")
+        for event, action in (event_policy or {}).items():
+            if action not in (jcore.dispatch.SHED_EARLY, jcore.dispatch.SHED_LATE, jcore.dispatch.BLOCK):
+                raise jcore.exceptions.ClientException(f"Unknown event policy `{action}` for `{event}`, expected one of: {jcore.dispatch.SHED_EARLY}, {jcore.dispatch.SHED_LATE}, {jcore.dispatch.BLOCK}")
         self.command_activator = command_activator
+        self.transport = transport
+        self.lazy_messages = lazy_messages
+        self.yield_every_lines = yield_every_lines
+        self.yield_every_us = yield_every_us
         self.max_connections_per_socket = max_connections
+        self.max_queue_size = max_queue_size
+        self.event_policy = event_policy
         self.sockets = []
         self.__modules = {}
-        self.__last_load_check = datetime.now()
-        self.__last_inactive_channels_check = datetime.now()
+        self.__extensions = {}
+        self.__handlers = {}
+        self.__line_handlers = {}
+        self.__commands = {}
+        self.__periodic = ()
+        self.__jobs = {}
+        self.__channel_sockets = {}
+        self.__migrations = {}
+        self.command_prefixes = command_activator
         self.load_ratio = load_ratio
         
         # pull channels from settings file.
@@ -69,6 +105,14 @@ class Client():
         
         self.loop = asyncio.get_event_loop()
         self.loop.set_exception_handler(self.handle_exception)
+        self.timers = jcore.scheduler.Scheduler(self.loop)
+        self.dispatcher = jcore.dispatch.Dispatcher(dispatch_policy, max_concurrency)
+        self.outbound = jcore.ratelimit.SendScheduler()
+        self.authentications = jcore.ratelimit.TokenBucket(jcore.ratelimit.AUTH_LIMIT, jcore.ratelimit.AUTH_PERIOD)
+        self.joins = jcore.ratelimit.JoinScheduler(jcore.ratelimit.JOIN_LIMIT_VERIFIED if verified_bot else jcore.ratelimit.JOIN_LIMIT)
+        self.balancer = jcore.balancer.Rebalancer(load_ratio, max_connections)
+        self.dedup = jcore.dedup.DedupCache(dedup_window)
+        self.__index_handlers()
         primary_socket = True
         for segment in self.__segment_channels(channel_list):
             self.append_new_socket(segment, primary_socket)
@@ -84,111 +128,249 @@ class Client():
     async def run(self):
         try:
             loop = asyncio.get_event_loop()
-            first = True
+            # sockets are brought up concurrently, within the authentication rate limit.
             for sock in self.sockets:
-                if not first:
-                    log.debug("waiting 5 seconds before spawning next socket, standby...")
-                    await asyncio.sleep(5)
-                    log.debug("spawning socket, standby...")
-                await sock.connect()
-                await asyncio.sleep(INTERVAL)
-                loop.create_task(sock.run())
-                first = False
+                loop.create_task(self.start_socket(sock))
                 
-            while True:
-                await asyncio.sleep(INTERVAL)                
-                if (datetime.now() - self.__last_load_check).seconds > INTERVAL_LOAD_BALANCE:
-                    self.__last_load_check = datetime.now()
-                    loop.create_task(self.check_load_balance())
-                    loop.create_task(self._ccb_on_heartbeat())
-                if (datetime.now() - self.__last_inactive_channels_check).seconds > INTERVAL_LOAD_BALANCE:
-                    loop.create_task(self.clear_inactive_channels())
+            timers = [
+                self.timers.call_every(INTERVAL_LOAD_BALANCE, self.check_load_balance),
+                self.timers.call_every(INTERVAL_INACTIVE_CHANNELS, self.clear_inactive_channels),
+                self.timers.call_every(INTERVAL_HEARTBEAT, self._dispatch_heartbeat),
+            ]
+            try:
+                # from here on everything is driven by the sockets and the timers.
+                await loop.create_future()
+            finally:
+                for timer in timers:
+                    timer.cancel()
         except KeyboardInterrupt:
             log.debug("Keyboard Interrupt Detected - departing channels.")
             for sock in self.sockets:
                 await sock.disconnect()
 
-    def append_new_socket(self, channel_list:list, primary_socket: bool = False):
+    def append_new_socket(self, channel_list:list, primary_socket: bool = False, register: bool = True):
         sock = jcore.jsocket.Socket(self, self.command_activator, primary_socket)
-        sock.set_channels(channel_list)
+        sock.set_channels(channel_list, register)
         self.sockets.append(sock)
         return sock
 
+    async def start_socket(self, socket):
+        """Connect a socket and start processing its messages as soon as its own handshake completes.
+        If the connection cannot be opened, the socket keeps retrying in the background (see 
+        `Socket.keep_connecting`) and its channels are joined once it is connected."""
+        try:
+            await socket.connect()
+        except OSError as e:
+            log.warning(f"Socket [{socket.name}] failed to connect, retrying. Details below\n{type(e)}: {e}")
+            self.loop.create_task(self.__retry_socket(socket))
+            return
+        except Exception as e:
+            log.exception(f"Socket [{socket.name}] failed to connect, closing it. Details below\n{type(e)}: {traceback.format_exc()}")
+            if socket in self.sockets:
+                await self.remove_socket_and_close(socket)
+            return
+        self.loop.create_task(socket.run())
+
+    async def __retry_socket(self, socket):
+        if await socket.keep_connecting():
+            self.loop.create_task(socket.run())
+
     async def remove_socket_and_close(self, socket):
         await socket.disconnect()
         self.sockets.remove(socket)
+        for channel in socket.channel_list:
+            self._unregister_channel(channel, socket)
+
+    @property
+    def channels(self) -> types.MappingProxyType:
+        """A read-only view of the joined channels, mapping each channel name to the socket it is joined on."""
+        return types.MappingProxyType(self.__channel_sockets)
+
+    def get_socket(self, channel: str) -> jcore.jsocket.Socket:
+        """Get the socket a channel is joined on, or `None`."""
+        return self.__channel_sockets.get(jcore.jsocket.normalise_channel(channel))
+
+    @property
+    def jobs(self) -> types.MappingProxyType:
+        """A read-only view of the scheduled periodic jobs, mapping each `(handler, channel)` to its 
+        `jcore.scheduler.Timer`. `channel` is `None` for jobs that are not run per channel."""
+        return types.MappingProxyType(self.__jobs)
+
+    def _register_channel(self, channel: str, socket):
+        """Called by a socket when a channel is added to it."""
+        if channel not in self.__channel_sockets:
+            self.__schedule_channel_jobs(channel)
+        self.__channel_sockets[channel] = socket
+
+    def _unregister_channel(self, channel: str, socket):
+        """Called when a channel is removed from a socket. The index is left alone when the
+        channel has already moved to another socket (e.g. during a migration)."""
+        if self.__channel_sockets.get(channel) is socket:
+            del self.__channel_sockets[channel]
+            self.__cancel_channel_jobs(channel)
     
     def load_module(self, module):
         self.__modules[module.name] = module
+        self.__index_handlers()
+
+    def unload_module(self, name: str):
+        """Remove a module previously added with `load_module`, 
+        it will no longer receive any events."""
+        if name not in self.__modules:
+            raise jcore.exceptions.ExtensionNotFound(name)
+        self.__modules.pop(name)
+        self.__index_handlers()
 
 
     async def check_load_balance(self):
-        # log.debug(f"Load balancing ({len(self.sockets)}) sockets. Load-ratio: '{self.load_ratio}'")
+        """Move channels between sockets to keep the message rate of each socket near `load_ratio`,
+        see `jcore.balancer.Rebalancer`. Channels are only measured once their rate window is full."""
+        loads = {}
+        pinned = set()
         for sock in self.sockets:
-            time_span = datetime.now() - sock.last_check
-            if time_span.seconds == 0:
+            if not sock.active:
                 continue
-            # log.debug(f"Testing Socket: '{sock.name}' standby...")
-            total = 0
-            largest_channel = 0
-            largest_channel_name = None
-            for channel, messages in sock.message_counter.items():
-                # log.debug(f"Channel: {channel} - {messages}")
-                if messages > largest_channel or largest_channel == 0:
-                    largest_channel = messages
-                    largest_channel_name = channel
-                total += messages
-            ratio = total/time_span.seconds
-            # log.debug(f"Socket [{sock.name}]: Largest Channel - {largest_channel_name} ({largest_channel}) | ratio: {ratio}")
-
-            if ratio > self.load_ratio and sock.current_connections > 1:
-                log.info(f"Socket [{sock.name}] LB: Splitting out noisy channel - {largest_channel_name}")
-                new_sock = self.append_new_socket([largest_channel_name])
-                await new_sock.connect()
-                loop = asyncio.get_event_loop()
-                loop.create_task(new_sock.run())
-                await sock.depart_channel(largest_channel_name)
-            elif ratio == 0 and sock.current_connections == 1 and len(self.sockets) > 1 and not sock.primary_socket:
-                log.info(f"Socket [{sock.name}] LB: consolidating socket")
+            loads[sock] = {}
+            for channel, window in sock.channel_rates.items():
+                loads[sock][channel] = window.rate
+                if window.age < window.size or channel in self.__migrations:
+                    pinned.add(channel)
+            pinned.add(sock.nick.lower())
+        migrations, retired = self.balancer.plan(loads, pinned)
+        if not migrations and not retired:
+            return
+        log.info(f"LB: migrating {len(migrations)} channel(s), closing {len(retired)} socket(s)")
+
+        # channels that do not fit on an existing socket share new sockets, joined before they are routed there.
+        new_sockets = {}
+        for migration in migrations:
+            if isinstance(migration.target, jcore.balancer.NewSocket):
+                new_sockets.setdefault(migration.target, []).append(migration.channel)
+        for placeholder, channels in new_sockets.items():
+            new_sockets[placeholder] = self.append_new_socket(channels, register=False)
+        await asyncio.gather(*[self.start_socket(sock) for sock in new_sockets.values()])
+
+        results = await asyncio.gather(*[
+            self.migrate_channel(migration.channel, new_sockets.get(migration.target, migration.target))
+            for migration in migrations])
+        for migration, migrated in zip(migrations, results):
+            if migrated:
+                self.balancer.migrated(migration.channel)
+
+        for sock in (*new_sockets.values(), *retired):
+            if sock.current_connections == 0 and not sock.primary_socket and sock in self.sockets:
+                log.info(f"Socket [{sock.name}] LB: closing empty socket")
                 await self.remove_socket_and_close(sock)
-                await self.join_channel(largest_channel_name)
-            sock.reset_message_counter()
-            await asyncio.sleep(INTERVAL)
+
+    async def migrate_channel(self, channel: str, target, timeout: float = jcore.jsocket.JOIN_TIMEOUT) -> bool:
+        """Move a channel to another socket without losing or repeating any of its messages.
+
+        The channel is joined on `target` while it is still joined on its current socket, and the 
+        messages received on both sockets in the meantime are deduplicated by their `id` (see `dedup`),
+        the others are only passed on from the socket the channel is routed to. Once the 
+        join is confirmed the channel is routed to `target` and only then parted from the old socket.
+        Returns whether the channel was moved, it stays on its current socket otherwise."""
+        channel = jcore.jsocket.normalise_channel(channel)
+        source = self.get_socket(channel)
+        if source is None or source is target:
+            return False
+        migration = self.__migrations[channel] = object()
+        try:
+            if target.has_channel(channel):
+                joined = await target.wait_for_join(channel, timeout)
+            else:
+                joined = await target.join_channel(channel, timeout, register=False)
+            if not joined:
+                log.warning(f"LB: channel `{channel}` could not be joined on socket [{target.name}], leaving it on [{source.name}]")
+                if target.has_channel(channel):
+                    await target.depart_channel(channel)
+                return False
+            target._adopt_rate_window(channel, source.channel_rates.get(channel))
+            self._register_channel(channel, target)
+            await source.depart_channel(channel)
+            log.info(f"LB: moved channel `{channel}` from socket [{source.name}] to [{target.name}]")
+            return True
+        finally:
+            self.loop.call_later(MIGRATION_GRACE, self.__end_migration, channel, migration)
+
+    def __end_migration(self, channel: str, migration: object):
+        if self.__migrations.get(channel) is migration:
+            del self.__migrations[channel]
+
+    def __is_migration_duplicate(self, message: RawMessage) -> bool:
+        """While a channel is joined on two sockets, messages without an `id` are only passed on from 
+        the socket the channel is routed to. Those with an `id` have been deduplicated by the sockets."""
+        channel = getattr(message, "channel", None)
+        if channel not in self.__migrations or getattr(message, "id", None):
+            return False
+        return message.socket is not self.__channel_sockets.get(channel)
             
 
     async def clear_inactive_channels(self):
-        self.__last_inactive_channels_check = datetime.now()
         for sock in self.sockets:
             if sock.has_inactive_connections:
                 log.info("Checking socket connections health")
                 await sock.health_check()
                 await asyncio.sleep(INTERVAL)
 
-    async def join_channel(self, channel):
-        socket: jcore.jsocket.Socket
-        for socket in self.sockets:
-            if socket.has_channel(channel):
-                raise jcore.exceptions.ClientException("Channel has already been joined.")
-        for socket in self.sockets:
-            if socket.current_connections < (self.max_connections_per_socket * 0.9):
-                await socket.join_channel(channel)
-                return
+    async def join_channel(self, channel, timeout: float = jcore.jsocket.JOIN_TIMEOUT) -> bool:
+        """Join a channel on a socket with spare capacity (or a new socket), and wait until 
+        the join is confirmed or rejected. Returns whether the channel was joined."""
+        if self.get_socket(channel) is not None:
+            raise jcore.exceptions.ClientException("Channel has already been joined.")
+        results = await self.join_channels([channel], timeout)
+        return results.get(jcore.jsocket.normalise_channel(channel), False)
+
+    async def join_channels(self, channels: list, timeout: float = jcore.jsocket.JOIN_TIMEOUT) -> dict:
+        """Join many channels concurrently. Channels are added to the sockets with spare capacity,
+        and new sockets are started for the rest. The JOIN requests are sent as the join budget
+        allows, and each channel is given `timeout` seconds from its request being sent to be 
+        confirmed.
+
+        Returns a dict of channel name to whether the channel was joined, channels that had 
+        already been joined are left out."""
+        joins = {}
+        assigned = {}
+        overflow = []
+        for channel in channels:
+            channel = jcore.jsocket.normalise_channel(channel)
+            if channel in joins or channel in overflow or channel in self.__channel_sockets:
+                continue
+            for socket in self.sockets:
+                if socket.current_connections + assigned.get(socket, 0) < (self.max_connections_per_socket * 0.9):
+                    assigned[socket] = assigned.get(socket, 0) + 1
+                    joins[channel] = socket.join_channel(channel, timeout)
+                    break
+            else:
+                overflow.append(channel)
+
+        if overflow:
+            new_sockets = [self.append_new_socket(segment) for segment in self.__segment_channels(overflow) if segment]
+            await asyncio.gather(*[self.start_socket(socket) for socket in new_sockets])
+            for socket in new_sockets:
+                for channel in socket.channel_list:
+                    joins[channel] = socket.wait_for_join(channel, timeout)
+
+        results = await asyncio.gather(*joins.values())
+        return dict(zip(joins, results))
         
     async def depart_channel(self, channel):
-        socket: jcore.jsocket.Socket
-        for socket in self.sockets:
-            if socket.has_channel(channel):
-                await socket.depart_channel(channel)
-
-    async def send_to_channel(self, channel, message):
-        socket: jcore.jsocket.Socket
-        found = False
-        for socket in self.sockets:
-            if socket.has_channel(channel):
-                found = True
-                await socket.send(channel=channel, message=message)
-        if not found:
+        socket = self.get_socket(channel)
+        if socket is not None:
+            await socket.depart_channel(channel)
+
+    async def send_to_channel(self, channel, message, lane: int = jcore.ratelimit.LANE_REPLY) -> asyncio.Future:
+        """Queue a message to be sent to a channel, within the client's rate limits. Like `message.send`,
+        this returns as soon as the message is queued, with a future that resolves to `True` once 
+        the message has been written, or to `False` if it was dropped or could not be sent."""
+        channel = jcore.jsocket.normalise_channel(channel)
+        socket = self.__channel_sockets.get(channel)
+        if socket is None:
             log.warning(f"Message could not be sent to channel '{channel}'. Check that this channel is still supposed to be connected. \nMessage: {message}")
+            future = self.loop.create_future()
+            future.set_result(False)
+            return future
+        return socket.send(channel=channel, message=message, lane=lane)
         
 
 
@@ -315,270 +497,131 @@ class Client():
         pass
     
     
-    # client Callbacks: These are called by the client and trigger behaviours.
-
-    async def _ccb_on_heartbeat(self):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_heartbeat"):
-            try:
-                self.loop.create_task(module.on_heartbeat())
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_heartbeat())
-    
-    # jcore.jsocket.Socket Callbacks: These are called by the socket when recieving messages.
-
-    async def _scb_on_raw(self, message: RawMessage):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_raw"):
-            try:
-                self.loop.create_task(module.on_raw(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_raw(message))
-    
-
-    async def _scb_on_message(self, message: Message):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_message"):
-            try:
-                self.loop.create_task(module.on_message(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_message(message))
-
-
-    async def _scb_on_join(self, message: Join):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_join"):
-            try:
-                self.loop.create_task(module.on_join(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_join(message))
-
-
-    async def _scb_on_mode(self, message: Mode):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_mode"):
-            try:
-                self.loop.create_task(module.on_mode(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_mode(message))
-
-    async def _scb_on_names(self, message: Names):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_names"):
-            try:
-                self.loop.create_task(module.on_names(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_names(message))
-
-    async def _scb_on_part(self, message: Part):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_part"):
-            try:
-                self.loop.create_task(module.on_part(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_part(message))
-
-    async def _scb_on_clearchat(self, message: ClearChat):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_clearchat"):
-            try:
-                self.loop.create_task(module.on_clearchat(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_clearchat(message))
-
-    async def _scb_on_clearmessage(self, message: ClearMessage):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_clearmessage"):
-            try:
-                self.loop.create_task(module.on_clearmessage(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_clearmessage(message))
-
-    async def _scb_on_hosttarget(self, message: HostTarget):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_hosttarget"):
-            try:
-                self.loop.create_task(module.on_hosttarget(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_hosttarget(message))
-
-    async def _scb_on_notice(self, message: Notice):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_notice"):
-            try:
-                self.loop.create_task(module.on_notice(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_notice(message))
-
-    async def _scb_on_reconnect(self, message: Reconnect):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_reconnect"):
-            try:
-                self.loop.create_task(module.on_reconnect(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_reconnect(message))
-
-    async def _scb_on_roomstate(self, message: RoomState):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_roomstate"):
-            try:
-                self.loop.create_task(module.on_roomstate(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_roomstate(message))
-
-    async def _scb_on_userstate(self, message: UserState):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_userstate"):
-            try:
-                self.loop.create_task(module.on_userstate(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_userstate(message))
-
-    async def _scb_on_global_userstate(self, message: GlobalUserState):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_global_userstate"):
-            try:
-                self.loop.create_task(module.on_global_userstate(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_global_userstate(message))
-
-    async def _scb_on_usernotice(self, message: UserNotice):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_usernotice"):
-            try:
-                self.loop.create_task(module.on_usernotice(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_usernotice(message))
-
-    async def _scb_on_ritual_usernotice(self, message: RitualUserNotice):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_ritual_usernotice"):
-            try:
-                self.loop.create_task(module.on_ritual_usernotice(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_ritual_usernotice(message))
-
-    async def _scb_on_bitbadgeupgrade_usernotice(self, message: BitBadgeUpgradeUserNotice):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_bitbadgeupgrade_usernotice"):
-            try:
-                self.loop.create_task(module.on_bitbadgeupgrade_usernotice(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_bitbadgeupgrade_usernotice(message))
-
-    async def _scb_on_raid_usernotice(self, message: RaidUserNotice):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_raid_usernotice"):
-            try:
-                self.loop.create_task(module.on_raid_usernotice(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_raid_usernotice(message))
-
-    async def _scb_on_whisper(self, message: Whisper):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_whisper"):
-            try:
-                self.loop.create_task(module.on_whisper(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_whisper(message))
-
-    async def _scb_on_subscriber_usernotice(self, message: SubscriberUserNotice):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_subscriber_usernotice"):
-            try:
-                self.loop.create_task(module.on_subscriber_usernotice(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_subscriber_usernotice(message))
-
-    async def _scb_on_giftedsubscriber_usernotice(self, message: GiftedSubscriberUserNotice):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_giftedsubscriber_usernotice"):
-            try:
-                self.loop.create_task(module.on_giftedsubscriber_usernotice(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_giftedsubscriber_usernotice(message))
-
-    async def _scb_on_privmessage(self, message: PrivateMessage):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_privmessage"):
-            try:
-                self.loop.create_task(module.on_privmessage(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_privmessage(message))
-
-    async def _scb_on_command(self, message: CommandMessage):
-        # parse modules and queue tasks
-        for module in self.__get_module_with_handler("on_command"):
-            try:
-                self.loop.create_task(module.on_command(message))
-            except Exception as e:
-                log.exception(f"Suppressing a caught an exception, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
-        # call local callback
-        self.loop.create_task(self.on_command(message))
-
-
-
+    # Dispatch: These are called by the client and the sockets to trigger the event handlers.
+
+    def _dispatch(self, message: RawMessage, event: str = None, queue: jcore.dispatch.EventQueue = None):
+        """Dispatch a message received by a socket to the `on_raw` handlers and, 
+        if `event` is set, to the handlers for that event. The work is bounded by the
+        socket's event `queue`, which may shed it."""
+        if self.__migrations and self.__is_migration_duplicate(message):
+            return
+        if event == "on_command":
+            handlers = self.__get_command_handlers(message)
+        else:
+            handlers = self.__line_handlers.get(event, ())
+        self.dispatcher.submit(handlers, message, queue=queue, event=event)
+
+    def _dispatch_heartbeat(self):
+        self.dispatcher.submit(self.__handlers.get("on_heartbeat", ()))
+
+    def __index_handlers(self):
+        """Rebuild the event name to bound handler index. Only the handlers that a module
+        overrides from `jcore.extensions.Module`, or that a subclass of the client overrides
+        from `Client`, are indexed, so events without any real subscribers dispatch nothing."""
+        handlers = {}
+        for module in self.__modules.values():
+            for event, handler in self.__get_overridden_handlers(module, Module):
+                handlers.setdefault(event, []).append(handler)
+        for event, handler in self.__get_overridden_handlers(self, Client):
+            handlers.setdefault(event, []).append(handler)
+        self.__handlers = {event: tuple(subscribers) for event, subscribers in handlers.items()}
+
+        raw_handlers = self.__handlers.get("on_raw", ())
+        self.__line_handlers = {None: raw_handlers}
+        for event in jcore.dispatch.EVENTS.values():
+            self.__line_handlers[event] = raw_handlers + self.__handlers.get(event, ())
+
+        commands = {}
+        for obj in (*self.__modules.values(), self):
+            for handler, command in self.__get_command_handlers_of(obj):
+                prefix = command.prefix or self.command_activator
+                for keyword in command.keywords:
+                    commands.setdefault((prefix, keyword), []).append((handler, command.channels))
+        self.__commands = {key: tuple(routes) for key, routes in commands.items()}
+        self.__periodic = tuple(periodic for obj in (*self.__modules.values(), self) for periodic in self.__get_periodic_handlers_of(obj))
+        self.__schedule_jobs()
+        prefixes = {self.command_activator, *(prefix for prefix, keyword in self.__commands)}
+        if len(prefixes) == 1:
+            self.command_prefixes = self.command_activator
+        else:
+            self.command_prefixes = tuple(sorted(prefixes, key=len, reverse=True))
+
+    def _is_command(self, message: CommandMessage) -> bool:
+        """Whether a `CommandMessage` is a command: it uses the command activator, or another prefix
+        together with a keyword registered for that prefix with `command`."""
+        return message.prefix == self.command_activator or (message.prefix, message.KEYWORD) in self.__commands
+
+    def __get_command_handlers(self, message: CommandMessage) -> tuple:
+        """Get the handlers for a command: the `on_command` handlers when the default command 
+        activator was used, followed by the handlers registered for the keyword with `command`."""
+        if message.prefix == self.command_activator:
+            handlers = self.__line_handlers["on_command"]
+        else:
+            handlers = self.__line_handlers[None]
+        routes = self.__commands.get((message.prefix, message.KEYWORD))
+        if routes is None:
+            return handlers
+        return handlers + tuple(handler for handler, channels in routes if channels is None or message.channel in channels)
+
+    def __schedule_jobs(self):
+        """Bring the timers of the periodic jobs in line with the loaded modules and the joined channels."""
+        wanted = {}
+        for handler, periodic in self.__periodic:
+            if periodic.per_channel:
+                for channel in self.__channel_sockets:
+                    wanted[(handler, channel)] = periodic
+            else:
+                wanted[(handler, None)] = periodic
+        for key in [key for key in self.__jobs if key not in wanted]:
+            self.__jobs.pop(key).cancel()
+        for key, periodic in wanted.items():
+            if key not in self.__jobs:
+                handler, channel = key
+                args = () if channel is None else (channel,)
+                self.__jobs[key] = self.timers.call_every(periodic.interval, handler, *args, jitter=periodic.jitter)
+
+    def __schedule_channel_jobs(self, channel: str):
+        for handler, periodic in self.__periodic:
+            if periodic.per_channel and (handler, channel) not in self.__jobs:
+                self.__jobs[(handler, channel)] = self.timers.call_every(periodic.interval, handler, channel, jitter=periodic.jitter)
+
+    def __cancel_channel_jobs(self, channel: str):
+        for handler, periodic in self.__periodic:
+            if periodic.per_channel and (handler, channel) in self.__jobs:
+                self.__jobs.pop((handler, channel)).cancel()
+
+    @staticmethod
+    def __get_periodic_handlers_of(obj):
+        for name in dir(type(obj)):
+            periodic = getattr(getattr(type(obj), name, None), "jcore_periodic", None)
+            if isinstance(periodic, Periodic):
+                yield getattr(obj, name), periodic
+
+    @staticmethod
+    def __get_command_handlers_of(obj):
+        for name in dir(type(obj)):
+            command = getattr(getattr(type(obj), name, None), "jcore_command", None)
+            if isinstance(command, Command):
+                yield getattr(obj, name), command
+
+    @staticmethod
+    def __get_overridden_handlers(obj, base: type):
+        for event in jcore.dispatch.HANDLERS:
+            implementation = getattr(type(obj), event, None)
+            if implementation is None or implementation is getattr(base, event, None):
+                continue
+            yield event, getattr(obj, event)
 
 
     # Internal Functions: Internal functions used to make the system work
 
     def __segment_channels(self, channels):
         return_list = []
-        counter = 0
         for channel in channels:
-            if counter < self.max_connections_per_socket:
-                return_list.append(channel.lower())
-                counter +=1 
-            else:
-                counter = 0
+            if len(return_list) >= self.max_connections_per_socket:
                 yield return_list
                 return_list = []
+            return_list.append(channel.lower())
         yield return_list
 
 
@@ -626,7 +669,7 @@ class Client():
         
 
     def _load_module(self, module):
-        if module in self.__modules:
+        if module in self.__extensions:
             raise jcore.exceptions.ExtensionAlreadyLoaded(module)
 
         spec = util.find_spec(module)
@@ -658,7 +701,7 @@ class Client():
             self._call_module_finalizers(lib, key)
             raise jcore.exceptions.ExtensionFailed(key, e) from e
         else:
-            self.__modules[key] = lib
+            self.__extensions[key] = lib
 
     
 
@@ -673,16 +716,5 @@ class Client():
             except Exception:
                 pass
         finally:
-            self.__modules.pop(key, None)
+            self.__extensions.pop(key, None)
             sys.modules.pop(key, None)
-
-    def __get_module_with_handler(self, handler: str):
-        for module in self.__modules:
-            try:
-                if hasattr(self.__modules[module], handler):
-                    yield self.__modules[module]
-            except AttributeError:
-                pass
-
-
-
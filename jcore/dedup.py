@@ -0,0 +1,61 @@
+import time
+
+
+# seconds a message id is remembered for, at least.
+DEDUP_WINDOW = 30
+# the most ids held in each of the two generations.
+DEDUP_MAX_ENTRIES = 100000
+
+
+class DedupCache():
+    """Remembers recently seen message ids to drop messages delivered more than once, e.g. by two
+    connections joined to the same channel while a channel is migrated or a connection is replaced.
+
+    Ids are kept in two generations of hash sets. New ids go into the current generation, which
+    becomes the previous one (and the old previous one is dropped) after `window` seconds or once
+    it holds `capacity` ids. Checks are O(1) and memory is bounded by twice the capacity, while an
+    id is remembered for at least `window` seconds unless the capacity is exceeded first."""
+    __slots__ = ("window", "capacity", "hits", "misses", "__current", "__previous", "__rotated")
+    window: float
+    capacity: int
+    hits: int
+    misses: int
+
+    def __init__(self, window: float = DEDUP_WINDOW, capacity: int = DEDUP_MAX_ENTRIES):
+        self.window = window
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.__current = set()
+        self.__previous = set()
+        self.__rotated = time.monotonic()
+
+    def seen(self, key) -> bool:
+        """Returns whether `key` has been seen before, and records it if it has not."""
+        if key in self.__current or key in self.__previous:
+            self.hits += 1
+            return True
+        if len(self.__current) >= self.capacity or time.monotonic() - self.__rotated >= self.window:
+            self.__rotate()
+        self.__current.add(key)
+        self.misses += 1
+        return False
+
+    def clear(self):
+        self.__current = set()
+        self.__previous = set()
+        self.__rotated = time.monotonic()
+
+    def __rotate(self):
+        self.__previous = self.__current
+        self.__current = set()
+        self.__rotated = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.__current) + len(self.__previous)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__current or key in self.__previous
+
+    def __repr__(self):
+        return f"[DedupCache]: {len(self)} ids (hits: {self.hits}, misses: {self.misses}, window: {self.window}s)"
@@ -0,0 +1,229 @@
+import asyncio
+from collections import deque
+import logging
+import traceback
+
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_CONCURRENCY = 100
+DEFAULT_QUEUE_SIZE = 10000
+YIELD_EVERY_UNITS = 100
+
+# dispatch policies
+POLICY_LINE = "line"
+POLICY_HANDLER = "handler"
+POLICIES = (POLICY_LINE, POLICY_HANDLER)
+
+# maps the `inner` type of a parsed message to the name of the event handler it triggers.
+EVENTS = {
+    "Message": "on_message",
+    "Join": "on_join",
+    "Mode": "on_mode",
+    "Names": "on_names",
+    "Part": "on_part",
+    "ClearChat": "on_clearchat",
+    "ClearMessage": "on_clearmessage",
+    "HostTarget": "on_hosttarget",
+    "Notice": "on_notice",
+    "Reconnect": "on_reconnect",
+    "RoomState": "on_roomstate",
+    "UserState": "on_userstate",
+    "GlobalUserState": "on_globaluserstate",
+    "UserNotice": "on_usernotice",
+    "RitualUserNotice": "on_ritual_usernotice",
+    "BitBadgeUpgradeUserNotice": "on_bitbadgeupgrade_usernotice",
+    "RaidUserNotice": "on_raid_usernotice",
+    "Whisper": "on_whisper",
+    "SubscriberUserNotice": "on_subscriber_usernotice",
+    "GiftedSubscriberUserNotice": "on_giftedsubscriber_usernotice",
+    "PrivateMessage": "on_privmessage",
+    "CommandMessage": "on_command",
+}
+
+# every event handler that can be implemented by a client or a module.
+HANDLERS = ("on_raw", "on_heartbeat", *EVENTS.values())
+
+# what an event queue does with an event once it fills up.
+SHED_EARLY = "shed_early"
+SHED_LATE = "shed_late"
+BLOCK = "block"
+# the share of the queue capacity at which events are dropped, events that block are never dropped.
+SHED_THRESHOLDS = {SHED_EARLY: 0.5, SHED_LATE: 1.0}
+# once full, a queue stops its socket reading until it has drained to this share of its capacity.
+RESUME_READING_RATIO = 0.5
+
+# `on_raw` stands for the lines that have no event of their own.
+DEFAULT_EVENT_POLICY = {
+    "on_raw": SHED_EARLY,
+    "on_join": SHED_EARLY,
+    "on_part": SHED_EARLY,
+    "on_names": SHED_EARLY,
+    "on_mode": SHED_EARLY,
+    "on_hosttarget": SHED_EARLY,
+    "on_message": SHED_LATE,
+    "on_privmessage": SHED_LATE,
+    "on_userstate": SHED_LATE,
+    "on_roomstate": SHED_LATE,
+    "on_globaluserstate": SHED_LATE,
+    "on_clearchat": SHED_LATE,
+    "on_clearmessage": SHED_LATE,
+    "on_command": BLOCK,
+    "on_whisper": BLOCK,
+    "on_notice": BLOCK,
+    "on_reconnect": BLOCK,
+    "on_usernotice": BLOCK,
+    "on_ritual_usernotice": BLOCK,
+    "on_bitbadgeupgrade_usernotice": BLOCK,
+    "on_raid_usernotice": BLOCK,
+    "on_subscriber_usernotice": BLOCK,
+    "on_giftedsubscriber_usernotice": BLOCK,
+}
+
+
+class EventQueue():
+    """Bounds the work a single source (a socket) has waiting in the dispatcher.
+
+    Every event is given an action by the policy. Once the queue holds `capacity * SHED_THRESHOLDS`
+    units of work, new `shed_early` and then `shed_late` events are dropped and counted. Events that
+    `block` are always queued, and when one fills the queue `pause` is called so the socket stops 
+    reading from the connection, until the queue has drained and `resume` is called. The memory held
+    by a queue is bounded by its capacity plus the data already read when reading was paused."""
+    __slots__ = ("capacity", "policy", "depth", "dropped", "pauses", "paused", "__pause", "__resume", "__limits", "__resume_at")
+    capacity: int
+    policy: dict
+    depth: int
+    dropped: dict
+    pauses: int
+    paused: bool
+
+    def __init__(self, capacity: int = DEFAULT_QUEUE_SIZE, policy: dict = None, pause = None, resume = None):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.policy = {**DEFAULT_EVENT_POLICY, **(policy or {})}
+        for event, action in self.policy.items():
+            if action not in (SHED_EARLY, SHED_LATE, BLOCK):
+                raise ValueError(f"Unknown action `{action}` for `{event}`, expected one of: {SHED_EARLY}, {SHED_LATE}, {BLOCK}")
+        self.depth = 0
+        self.dropped = {}
+        self.pauses = 0
+        self.paused = False
+        self.__pause = pause
+        self.__resume = resume
+        self.__limits = {event: capacity * SHED_THRESHOLDS[action] if action in SHED_THRESHOLDS else None for event, action in self.policy.items()}
+        self.__resume_at = capacity * RESUME_READING_RATIO
+
+    @property
+    def total_dropped(self) -> int:
+        return sum(self.dropped.values())
+
+    def put(self, event: str, units: int = 1) -> bool:
+        """Account for `units` of work for `event` (`None` for lines without an event of their own).
+        Returns whether the work should be queued, `False` when the event is shed."""
+        event = event or "on_raw"
+        limit = self.__limits.get(event)
+        if limit is not None and self.depth >= limit:
+            self.dropped[event] = self.dropped.get(event, 0) + 1
+            return False
+        self.depth += units
+        if limit is None and self.depth >= self.capacity and not self.paused:
+            self.paused = True
+            self.pauses += 1
+            if self.__pause is not None:
+                self.__pause()
+        return True
+
+    def task_done(self):
+        """Called by the dispatcher when a unit of work has been processed."""
+        self.depth -= 1
+        if self.paused and self.depth <= self.__resume_at:
+            self.paused = False
+            if self.__resume is not None:
+                self.__resume()
+
+    def __repr__(self):
+        return f"[EventQueue]: {self.depth}/{self.capacity} (dropped: {self.total_dropped}, pauses: {self.pauses}, paused: {self.paused})"
+
+
+class Dispatcher():
+    """Runs event handlers on a bounded pool of worker tasks.
+
+    Work is submitted as a list of handlers together with the arguments to call them with.
+    Workers are only started while there is work queued, and never more than `max_concurrency`
+    at once; a worker keeps draining the queue until it is empty, so a burst of lines does not
+    create a task per line or per handler. Work submitted with an `EventQueue` is bounded by it.
+
+    Policies
+    --------
+    line:
+        All the handlers for a line are awaited in order by the same worker.
+        Up to `max_concurrency` lines are processed concurrently.
+    handler:
+        Every handler is queued as its own unit of work, so a slow handler does not
+        hold up the other handlers for the same line.
+    """
+    __queue: deque
+    __workers: int
+
+    def __init__(self, policy: str = POLICY_LINE, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown dispatch policy `{policy}`, expected one of: {', '.join(POLICIES)}")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.policy = policy
+        self.max_concurrency = max_concurrency
+        self.loop = asyncio.get_event_loop()
+        self.__queue = deque()
+        self.__workers = 0
+
+    @property
+    def pending(self) -> int:
+        """The number of units of work waiting for a worker."""
+        return len(self.__queue)
+
+    @property
+    def active_workers(self) -> int:
+        return self.__workers
+
+    def submit(self, handlers: list, *args, queue: EventQueue = None, event: str = None) -> bool:
+        """Queue `handlers` to be called with `args`. Exceptions raised by a handler are
+        logged and do not affect any of the other handlers. When `queue` is given, the work is
+        accounted to it as `event`. Returns `False` if the queue shed the work."""
+        if not handlers:
+            return True
+        if self.policy == POLICY_HANDLER:
+            if queue is not None and not queue.put(event, len(handlers)):
+                return False
+            for handler in handlers:
+                self.__queue.append(((handler,), args, queue))
+        else:
+            if queue is not None and not queue.put(event):
+                return False
+            self.__queue.append((handlers, args, queue))
+        while self.__workers < self.max_concurrency and self.__workers < len(self.__queue):
+            self.__workers += 1
+            self.loop.create_task(self.__worker())
+        return True
+
+    async def __worker(self):
+        try:
+            processed = 0
+            while self.__queue:
+                handlers, args, queue = self.__queue.popleft()
+                try:
+                    for handler in handlers:
+                        try:
+                            await handler(*args)
+                        except Exception as e:
+                            log.exception(f"Suppressing a caught an exception in `{getattr(handler, '__qualname__', handler)}`, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
+                finally:
+                    # also when the worker is cancelled, so the queue depth stays accurate.
+                    if queue is not None:
+                        queue.task_done()
+                processed += 1
+                if processed % YIELD_EVERY_UNITS == 0:
+                    await asyncio.sleep(0)
+        finally:
+            self.__workers -= 1
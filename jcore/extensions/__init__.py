@@ -1,2 +1,3 @@
-
-from .module import Module
\ No newline at end of file
+from .module import Module
+from .command import Command, command
+from .periodic import Periodic, periodic
@@ -0,0 +1,52 @@
+class Command():
+    """Describes a chat command handled by a method decorated with `command`."""
+    __slots__ = ("keyword", "aliases", "prefix", "channels")
+    keyword: str
+    aliases: tuple
+    prefix: str
+    channels: frozenset
+
+    def __init__(self, keyword: str, aliases: tuple = (), prefix: str = None, channels: list = None):
+        self.keyword = keyword.lower()
+        self.aliases = tuple(alias.lower() for alias in aliases)
+        self.prefix = prefix
+        self.channels = None if channels is None else frozenset(channel.lower().lstrip("#") for channel in channels)
+
+    @property
+    def keywords(self) -> tuple:
+        return (self.keyword,) + self.aliases
+
+    def __repr__(self):
+        return f"[Command]: {self.prefix or ''}{self.keyword} (aliases: {self.aliases}, channels: {self.channels})"
+
+
+def command(keyword: str, aliases: tuple = (), prefix: str = None, channels: list = None):
+    """Register a method of a `Module` (or a `Client` subclass) as the handler for a chat command.
+
+    The handler is called with the `CommandMessage` only when the keyword (or one of its aliases)
+    is used, instead of every `on_command` handler having to compare `message.KEYWORD`.
+
+    Parameters
+    ----------
+    keyword:
+        The command keyword, matched case-insensitively (e.g. `ping` for `!ping`).
+    aliases:
+        Alternative keywords that trigger the same handler.
+    prefix:
+        The prefix the command must be used with. Defaults to the client's `command_activator`.
+    channels:
+        If set, the command is only handled in these channels.
+
+    Example
+    -------
+    ```
+    class Ping(Module):
+        @command("ping", aliases=("p",))
+        async def ping(self, message: CommandMessage):
+            await message.send("pong...")
+    ```
+    """
+    def decorator(func):
+        func.jcore_command = Command(keyword, aliases, prefix, channels)
+        return func
+    return decorator
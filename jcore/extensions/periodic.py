@@ -0,0 +1,49 @@
+class Periodic():
+    """Describes a job run at a fixed interval by a method decorated with `periodic`."""
+    __slots__ = ("interval", "jitter", "per_channel")
+    interval: float
+    jitter: float
+    per_channel: bool
+
+    def __init__(self, interval: float, jitter: float = 0, per_channel: bool = False):
+        if interval <= 0:
+            raise ValueError("interval must be greater than 0")
+        self.interval = interval
+        self.jitter = jitter
+        self.per_channel = per_channel
+
+    def __repr__(self):
+        return f"[Periodic]: every {self.interval}s (jitter: {self.jitter}s, per channel: {self.per_channel})"
+
+
+def periodic(interval: float, jitter: float = 0, per_channel: bool = False):
+    """Run a method of a `Module` (or a `Client` subclass) every `interval` seconds.
+
+    All the jobs share the client's timer heap (`Client.timers`) instead of each running its own
+    `while True: sleep` loop. A run is skipped, and counted as an overrun, while the previous run
+    of the same job is still going.
+
+    Parameters
+    ----------
+    interval:
+        Seconds between runs, the first run is one interval after the job is scheduled.
+    jitter:
+        Each run is delayed by a random amount of up to `jitter` seconds, so jobs with the same 
+        interval do not all fire at once.
+    per_channel:
+        If set, the job runs separately for every joined channel and is called with the channel
+        name, otherwise it runs once and is called without arguments.
+
+    Example
+    -------
+    ```
+    class Reminder(Module):
+        @periodic(600, jitter=30, per_channel=True)
+        async def remind(self, channel: str):
+            await self.client.send_to_channel(channel, "Remember to hydrate!")
+    ```
+    """
+    def decorator(func):
+        func.jcore_periodic = Periodic(interval, jitter, per_channel)
+        return func
+    return decorator
@@ -1,32 +1,65 @@
 import asyncio
-from asyncio import StreamReader, StreamWriter
 from concurrent.futures import ProcessPoolExecutor
 from jcore.exceptions import JarvisException
 #import socket
 import traceback
+import random
 import uuid
 import logging
 
 
 from datetime import datetime
 from jcore.helpers import Settings
+import types
 from .messageparser import parse_line
+from .transport import Transport
+from .dispatch import EVENTS, EventQueue
+from .ratelimit import LANE_REPLY
+from .stats import RateWindow
+from .backoff import Backoff, RECONNECT_NOTICE_SPREAD
 
 executor = ProcessPoolExecutor(2)
 
 
-INTERVAL = 0.001
-JOIN_LIMIT = 10
+JOIN_TIMEOUT = 10
+# notices that tell a join request has failed.
+JOIN_FAILURE_NOTICES = ("msg_banned", "msg_channel_suspended")
+
+
+def normalise_channel(channel: str) -> str:
+    """Normalise a channel name to the form used in parsed messages: lower case, without the `#`."""
+    return channel.lower().lstrip("#")
+
+
+class ChannelState():
+    """The state of a channel joined (or being joined) on a socket."""
+    __slots__ = ("name", "active", "banned", "activation_failures", "messages")
+    name: str
+    active: bool
+    banned: bool
+    activation_failures: int
+    messages: RateWindow
+
+    def __init__(self, name: str, activation_failures: int = 0):
+        self.name = name
+        self.active = False
+        self.banned = False
+        self.activation_failures = activation_failures
+        self.messages = RateWindow()
+
+    def __repr__(self):
+        return f"[ChannelState]: {self.name} (active: {self.active}, banned: {self.banned}, activation failures: {self.activation_failures}, {self.messages.rate:.2f}/s)"
+
 
 class Socket():
     """A wrapper for the low-level core library socket interface, 
     and customised to facilitate communication with the Twitch IRC API."""
-    __message_counter:dict
     last_check:datetime
     primary_socket: bool
     log:logging
-    reader: StreamReader
-    writer: StreamWriter
+    transport: Transport
+    backoff: Backoff
+    events: EventQueue
 
     def __init__(self, client, command_activator: str, primary_socket:bool = False):
         self.__name = uuid.uuid4().hex[:8]
@@ -35,31 +68,57 @@ class Socket():
         self.command_activator = command_activator
         self.active = True
         self.__channels = {}
-
-        self.buffer = ""
+        self.__active = set()
+        self.__inactive = set()
+        self.__banned = set()
+        self.__received = RateWindow()
+        self.__join_requests = {}
+        self.__join_waiters = {}
+
+        self.transport = None
+        self.backoff = Backoff()
+        self.__replacement = None
+        self.__reconnection = None
+        self.__standby = None
+        self.__standby_joins = {}
+        self.__standby_requests = {}
+        self.__readers = {}
+        self.events = EventQueue(client.max_queue_size, client.event_policy, self.__pause_reading, self.__resume_reading)
         # self.socket = None
         config = Settings().get_all_settings()
         self.nick = config["nick"]
         self.token = config["token"]
         self.loop = asyncio.get_event_loop()
-        self.__message_counter = {}
         self.last_check = datetime.now()
         self.primary_socket = primary_socket
+        self.yield_every_lines = client.yield_every_lines
+        self.yield_every_us = client.yield_every_us
 
-    def set_channels(self, channels: list):
+    def set_channels(self, channels: list, register: bool = True):
+        """Set the channels to join when the socket connects. With `register` unset the channels 
+        are not routed to this socket by the client until it is told to (see `Client.migrate_channel`)."""
         for channel in channels:
-            self.__channels[channel] = {"active": False, "message_counter": 0, "activation_failures": 0, "banned": False}
+            channel = normalise_channel(channel)
+            self.__add_channel(channel)
+            if register:
+                self.client._register_channel(channel, self)
         
 
     def reset_message_counter(self):
-        for channel in self.__channels:
-            self.__channels[channel]["message_counter"] = 0
+        for state in self.__channels.values():
+            state.messages = RateWindow()
+        self.__received = RateWindow()
         self.last_check = datetime.now()
     
     @property
     def name(self) -> str:
         return self.__name
 
+    @property
+    def channels(self) -> types.MappingProxyType:
+        """A read-only view of the channels of the socket, mapping each channel name to its `ChannelState`."""
+        return types.MappingProxyType(self.__channels)
+
     @property
     def channel_list(self) -> list:
         outlist= []
@@ -70,17 +129,34 @@ class Socket():
 
     @property
     def message_counter(self) -> dict:
+        """The number of messages received per channel over the last minute."""
+        outdict = {}
+        for key, state in self.__channels.items():
+            outdict[key] = state.messages.count
+        return outdict
+
+    @property
+    def channel_rates(self) -> dict:
+        """The `RateWindow` tracking the messages received in each channel."""
         outdict = {}
-        for key, values in self.__channels.items():
-            outdict[key] = values["message_counter"]
+        for key, state in self.__channels.items():
+            outdict[key] = state.messages
         return outdict
+
+    def _adopt_rate_window(self, channel: str, window: RateWindow):
+        """Keep tracking a channel moved from another socket with the window it was measured in."""
+        if channel in self.__channels and window is not None:
+            self.__channels[channel].messages = window
+
+    @property
+    def message_rate(self) -> float:
+        """The number of messages received per second, across all channels, over the last minute."""
+        return self.__received.rate
     
     @property
     def total_messages(self) -> int:
-        m = 0
-        for k,v in self.__channels.items():
-            m += v["message_counter"]
-        return m
+        """The number of messages received, across all channels, over the last minute."""
+        return self.__received.count
     
     @property
     def average_messages(self) -> float:
@@ -90,25 +166,21 @@ class Socket():
     def current_connections(self) -> int:
         return len(self.__channels)
     
+    @property
+    def active_connections(self) -> list:
+        return list(self.__active)
+
     @property
     def inactive_connections(self) -> list:
-        outlist = []
-        for channel, values in self.__channels.items():
-            if not values["active"]:
-                outlist.append(channel)
-        return outlist
+        return list(self.__inactive)
 
     @property
     def banned_channels(self) -> list:
-        outlist = []
-        for channel, values in self.__channels.items():
-            if values["banned"]:
-                outlist.append(channel)
-        return outlist
+        return list(self.__banned)
 
     @property
     def has_inactive_connections(self) -> bool:
-        return len(self.inactive_connections) > 0
+        return len(self.__inactive) > 0
 
 
     async def connect(self):
@@ -116,43 +188,44 @@ class Socket():
         if len(self.__channels) == 0: 
             raise Exception("Channels list hasn't been set.")
         self.log.info(f"Initialising connection to: {self.channel_list}")
-        # self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.reader,self.writer = await asyncio.open_connection(host="irc.chat.twitch.tv", port=6667)
-        
-        # await self.loop.run_in_executor(executor, self.socket.connect, ("irc.chat.twitch.tv", 6667))
-        await self._send_raw(f"PASS {self.token}")
-        await self._send_raw(f"NICK {self.nick}")
-        await self._send_raw("CAP REQ :twitch.tv/membership")
-        await self._send_raw("CAP REQ :twitch.tv/tags")
-        await self._send_raw("CAP REQ :twitch.tv/commands")
-
-        counter = 1
-
-        for channel in self.__channels:
-            if counter % JOIN_LIMIT == 0:
-                self.log.debug("Pausing join requests, standby...")
-                await asyncio.sleep(5)
-            counter += 1
-            await self._join(channel)
-            self.__message_counter[channel] = 0
+        self.transport = await self.__open_transport()
+        self.__request_joins()
         self.last_ping = datetime.now()
         self.log.info(f"Socket engaged.")
 
+    async def __open_transport(self) -> Transport:
+        """Open and authenticate a new connection, within the client's authentication rate limit."""
+        await self.client.authentications.acquire()
+        transport = self.client.transport(self)
+        await transport.connect()
+        for message in (f"PASS {self.token}", f"NICK {self.nick}", "CAP REQ :twitch.tv/membership", "CAP REQ :twitch.tv/tags", "CAP REQ :twitch.tv/commands"):
+            self._write_raw(message, transport)
+        await transport.drain()
+        return transport
+
+    def __request_joins(self):
+        """(Re)join every channel of the socket. The client's join scheduler writes the JOIN 
+        requests, batched, as the join budget allows."""
+        for channel, state in self.__channels.items():
+            state.active = False
+            self.__inactive.add(channel)
+            self.__join_requests[channel] = self.client.joins.request(self, channel)
+        self.__active.clear()
+
 
     async def disconnect(self):
         try:
             self.log.info(f"departing channels")
             self.active = False
+            self.client.joins.cancel(self)
             try:
-                tasks = []
-                for channel in self.__channels:
-                    if self.writer:
-                        tasks.append(self._part(channel))
-                asyncio.gather(*tasks, loop=self.loop)
+                if self.transport and not self.transport.is_closing():
+                    await asyncio.gather(*[self._part(channel) for channel in self.__channels])
             except Exception as e:
                 self.log.critical(f"Suppressing a caught an exception in `Socket.disconnect()` [Parting channel]. Details below\n{type(e)}: {traceback.format_exc()}")
             try:
-                self.writer.close()
+                self.__discard_standby()
+                self.transport.close()
                 # self.socket.close()
             except Exception as e:
                 self.log.critical(f"Suppressing a caught an exception in `Socket.disconnect()` [closing socket]. Details below\n{type(e)}: {traceback.format_exc()}")
@@ -161,39 +234,198 @@ class Socket():
         
 
     async def reconnect(self):
+        """Reconnect after the connection has been lost, see `keep_connecting`."""
         self.log.info(f"Reconnect detected!")
         await self.disconnect()
-        self.log.info(f"Waiting 10s to reconnect.")
-        await asyncio.sleep(10)
-        self.log.info(f"Reconnecting, standby...")
-        await self.connect()
-
-
-    async def _join(self, channel):
-        await self._send_raw(f"JOIN #{channel} ")
+        self.active = True
+        await self.keep_connecting()
+
+    async def keep_connecting(self) -> bool:
+        """Connect, retrying for as long as the connection cannot be opened. Attempts are spaced 
+        out by the socket's `backoff`, which is reset once a channel has been joined again.
+        Returns `False` if the socket was disconnected before a connection could be opened."""
+        while True:
+            delay = self.backoff.next_delay()
+            self.log.info(f"Waiting {delay:.1f}s to reconnect.")
+            await asyncio.sleep(delay)
+            if not self.active:
+                return False
+            self.log.info(f"Reconnecting, standby...")
+            try:
+                await self.connect()
+                return True
+            except OSError as e:
+                self.log.warning(f"Reconnection attempt {self.backoff.attempts} failed. Details below\n{type(e)}: {e}")
+
+    async def __replace_connection(self):
+        """Move to a new connection ahead of the server closing the current one (RECONNECT).
+
+        The new connection is authenticated and joins every channel while the current one keeps
+        delivering messages, and messages with an `id` received on both are only processed once
+        (see `Client.dedup`).
+        When the channels are confirmed on the new connection (or after `JOIN_TIMEOUT`) it takes 
+        over and the old connection is closed. The reaction is spread over a few seconds so the
+        sockets do not all reconnect at once, unless the current connection is closed first."""
+        await asyncio.wait([self.__get_reader(self.transport)], timeout=random.uniform(0, RECONNECT_NOTICE_SPREAD))
+        if not self.active:
+            return
+        self.log.info(f"Server requested a reconnect, opening a replacement connection.")
+        try:
+            transport = await self.__open_transport()
+        except OSError as e:
+            # `run` reconnects once the server has closed the current connection.
+            self.log.warning(f"Failed to open a replacement connection. Details below\n{type(e)}: {e}")
+            return
+        if not self.active:
+            transport.close()
+            return
+        self.__standby = transport
+        self.__standby_joins = {channel: self.loop.create_future() for channel in self.__channels}
+        self.__standby_requests = {channel: self.client.joins.request(self, channel, transport) for channel in self.__standby_joins}
+        self.__get_reader(transport)
+        await asyncio.gather(*self.__standby_requests.values(), return_exceptions=True)
+        if self.__standby_joins:
+            await asyncio.wait(list(self.__standby_joins.values()), timeout=JOIN_TIMEOUT)
+        if self.__standby is transport:
+            self.__promote_standby()
+
+    def __promote_standby(self):
+        """Switch over to the replacement connection and close the current one. Channels that were
+        not confirmed on the replacement connection are left to the JOIN requests already made on 
+        it, which are now written to (or answered on) the current connection, the others are joined again."""
+        previous, self.transport = self.transport, self.__standby
+        joins, self.__standby, self.__standby_joins = self.__standby_joins, None, {}
+        requests, self.__standby_requests = self.__standby_requests, {}
+        self.log.info(f"Switched to the replacement connection, {sum(1 for joined in joins.values() if joined.done() and joined.result())}/{len(joins)} channel(s) confirmed.")
+        for channel in self.__channels:
+            joined = joins.get(channel)
+            if joined is None or not joined.done() or not joined.result():
+                self.__deactivate_channel(channel)
+                request = requests.get(channel)
+                if request is None or request.cancelled() or (request.done() and not request.result()):
+                    request = self.client.joins.request(self, channel)
+                self.__join_requests[channel] = request
+        for channel, joined in joins.items():
+            joined.cancel()
+            if channel not in self.__channels:
+                # departed while the replacement connection was being set up.
+                self._write_raw(f"PART #{channel} ")
+        previous.close()
+
+    def __discard_standby(self):
+        if self.__standby is not None:
+            self.__standby.close()
+            self.__standby = None
+        for joined in self.__standby_joins.values():
+            joined.cancel()
+        self.__standby_joins = {}
+        self.__standby_requests = {}
+
+    def __resolve_standby_join(self, channel, joined: bool):
+        future = self.__standby_joins.get(channel)
+        if future is not None and not future.done():
+            future.set_result(joined)
+
+    def __get_reader(self, transport: Transport) -> asyncio.Task:
+        """Get the task processing the incoming data of a connection, starting it if need be."""
+        reader = self.__readers.get(transport)
+        if reader is None:
+            reader = self.__readers[transport] = self.loop.create_task(transport.run())
+            reader.add_done_callback(lambda task: self.__readers.pop(transport, None))
+        return reader
+
+
+    async def _join(self, channel) -> bool:
+        """Queue a JOIN request for the channel and wait until it has been written. Returns `False` 
+        if the request was dropped (e.g. the socket disconnected) or could not be written."""
+        request = self.__join_requests[channel] = self.client.joins.request(self, channel)
+        try:
+            return await asyncio.shield(request)
+        except asyncio.CancelledError:
+            if request.cancelled():
+                return False
+            raise
 
     async def _part(self, channel):
-        await self._send_raw(f"PART #{channel} ")
-
-    async def join_channel(self, channel):
+        if self.transport is None or self.transport.is_closing():
+            return
+        try:
+            await self._send_raw(f"PART #{channel} ")
+        except OSError:
+            # logged by `_send_raw`, the channel is not joined again on the next connection.
+            pass
+
+    async def join_channel(self, channel, timeout: float = JOIN_TIMEOUT, register: bool = True) -> bool:
+        """Join a channel, and wait until the server confirms the join (NAMES or ROOMSTATE) 
+        or rejects it (a ban or suspension NOTICE). Returns whether the channel was joined,
+        `False` is also returned if neither reply arrives within `timeout` seconds of the 
+        JOIN request being sent. See `set_channels` for `register`."""
+        channel = normalise_channel(channel)
         self.log.info(f"Sending request to join channel `{channel}`")
         try:
-            self.__channels[channel] = {"active": False, "message_counter": 0, "activation_failures": 3, "banned": False}
+            self.__add_channel(channel, activation_failures=3)
+            if register:
+                self.client._register_channel(channel, self)
+            self.__get_join_waiter(channel)
             await self._join(channel)
-            await asyncio.sleep(2)
         except JarvisException as ex:
             self.log.error(f"An error occurred when attemting to leave the channel `{channel}`\nDetails below\n{type(ex)}: {traceback.format_exc()}")
-            return
-        if self.__channels[channel]["active"]:
+            return False
+        joined = await self.wait_for_join(channel, timeout)
+        if joined:
             self.log.info(f"Successfully joined channel `{channel}`")
         else:
             self.log.warning(f"There was an issue adding the channel `{channel}`, check the logs for any further details.")
+        return joined
+
+    async def wait_for_join(self, channel, timeout: float = JOIN_TIMEOUT) -> bool:
+        """Wait until a channel of this socket is joined or rejected by the server, see `join_channel`.
+        The timeout starts once the JOIN request for the channel has been sent."""
+        channel = normalise_channel(channel)
+        if channel not in self.__channels:
+            return False
+        if channel in self.__active:
+            return True
+        waiter = self.__get_join_waiter(channel)
+        request = self.__join_requests.get(channel)
+        if request is not None:
+            try:
+                if not await asyncio.shield(request):
+                    # the join request could not be written, the connection was lost.
+                    return False
+            except asyncio.CancelledError:
+                if request.cancelled():
+                    # the join request was dropped, e.g. because the socket disconnected.
+                    return False
+                raise
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if self.__join_waiters.get(channel) is waiter:
+                self.__join_waiters.pop(channel)
+            return False
+
+    def __get_join_waiter(self, channel) -> asyncio.Future:
+        waiter = self.__join_waiters.get(channel)
+        if waiter is None:
+            waiter = self.__join_waiters[channel] = self.loop.create_future()
+        return waiter
+
+    def __resolve_join(self, channel, joined: bool):
+        waiter = self.__join_waiters.pop(channel, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(joined)
 
     
     async def depart_channel(self, channel):
+        channel = normalise_channel(channel)
         self.log.info(f"Sending request to leave channel `{channel}`")
         try:
-            self.__channels.pop(channel)
+            self.__remove_channel(channel)
+            self.client._unregister_channel(channel, self)
+            # a JOIN still waiting for the join budget would otherwise be written after the PART.
+            self.client.joins.discard(self, channel)
+            self.__resolve_join(channel, False)
             await self._part(channel)
         except JarvisException as ex:
             self.log.error(f"An error occurred when attemting to leave the channel `{channel}`\nDetails below\n{type(ex)}: {traceback.format_exc()}")
@@ -205,180 +437,232 @@ class Socket():
 
 
     def has_channel(self, channel) -> bool:
-        return channel in self.__channels 
+        return normalise_channel(channel) in self.__channels
 
     
     async def health_check(self):
         counter_limit = 3
         counter = 0
-        for channel, values in self.__channels.items():
-            if not values["active"] and values["activation_failures"] < 3:
-                if not values["banned"]:
+        for channel in list(self.__inactive):
+            state = self.__channels.get(channel)
+            if state is not None and state.activation_failures < 3:
+                if not state.banned:
                     self.log.warn(f"Channel `{channel}` was found to be inactive. resending join request.")
                     await self._part(channel)
                     await self._join(channel)
                 else:
                     self.log.warn(f"You're banned from channel `{channel}` - will not reinitiate connected to this channel.")
-                values["activation_failures"] += 1
+                state.activation_failures += 1
                 counter += 1
                 if counter > counter_limit:
                     return
 
 
-    async def send(self, channel: str, message: str):
-        self.log.info(f"Sent ({channel}): {message}")
-        await self._send_raw(f"PRIVMSG #{channel.lower()} :{message}")
+    def send(self, channel: str, message: str, lane: int = LANE_REPLY) -> asyncio.Future:
+        """Queue a message to be sent to the channel in the given outbound lane, within the 
+        client's rate limits. Returns a future that resolves to `True` once the message has 
+        been written, or to `False` if it was dropped."""
+        self.log.info(f"Queued ({channel}): {message}")
+        channel = channel.lower()
+        return self.client.outbound.send(self, channel, f"PRIVMSG #{channel} :{message}", lane)
 
-    async def _send_raw(self, message: str):
+    def _write_raw(self, message: str, transport: Transport = None):
+        if message[:4] == "PASS":
+            self.log.debug(f" < PASS ****")
+        else:
+            self.log.debug(f" < {message}")
+        (transport or self.transport).write((f"{message}\r\n").encode('utf-8'))
+        # self.socket.send((f"{message}\r\n").encode('utf-8'))
+
+    async def _send_raw(self, message: str, transport: Transport = None):
+        """Write a line to the current connection (or `transport`) and wait until it has been flushed.
+        Raises `OSError` if the line could not be written, a broken connection is reconnected in 
+        the background so the caller (e.g. the client's send scheduler) is not held up."""
+        transport = transport or self.transport
         try:
-            if message[:4] == "PASS":
-                self.log.debug(f" < PASS ****")
-            else:
-                self.log.debug(f" < {message}")
-            self.writer.write((f"{message}\r\n").encode('utf-8'))
-            # self.socket.send((f"{message}\r\n").encode('utf-8'))
-            await asyncio.sleep(INTERVAL)
+            self._write_raw(message, transport)
+            await transport.drain()
         except BrokenPipeError:
             self.log.critical(f"Broken pipe identified. Triggering reconnection '{message}'")
-            await self.reconnect()
+            if transport is self.transport:
+                self.__get_reconnection()
+            raise
         except OSError:
             self.log.critical(f"Socket is closed and must be reopened to send the message '{message}'")
+            raise
+
+    def __get_reconnection(self) -> asyncio.Task:
+        """Get the task reconnecting the socket, starting it if need be."""
+        if self.__reconnection is None or self.__reconnection.done():
+            self.__reconnection = self.loop.create_task(self.reconnect())
+        return self.__reconnection
 
 
     async def run(self):
         try:
             while self.active:
-                await self.__process_stream_message()
-            try:
-                self.writer.close()
-                # self.socket.close()
-            except Exception as e:
-                self.log.critical(f"Suppressing a caught an exception while attempting to close the socket in `Socket.run()`. Details below\n{type(e)}: {traceback.format_exc()}")
+                transport = self.transport
+                try:
+                    await self.__get_reader(transport)
+                except OSError as e:
+                    self.log.warning(f"OSError detected, socket issue identitfied. Attempting to recover socket. Details below\n{type(e)}: {traceback.format_exc()}")
+                if transport is not self.transport:
+                    # replaced by a new connection after a RECONNECT notice.
+                    continue
+                if self.__standby is not None:
+                    # closed by the server before the replacement connection had joined every channel.
+                    self.__promote_standby()
+                    continue
+                if self.__replacement is not None and not self.__replacement.done():
+                    # closed by the server before the replacement connection was open.
+                    await self.__replacement
+                    if transport is not self.transport:
+                        continue
+                if self.__reconnection is not None and not self.__reconnection.done():
+                    # already reconnecting after a write found the connection broken.
+                    await self.__reconnection
+                    continue
+                if self.active:
+                    self.log.warn("Connection closed by the server, will attempt to reconnect socket. Standby...")
+                    await self.__get_reconnection()
         finally: 
             self.log.info(f"Closing socket.")
-            if (self.writer):
-                # if (self.socket):
+            if (self.transport):
                 await self.disconnect()
 
 
+    def __add_channel(self, channel: str, activation_failures: int = 0):
+        self.__remove_channel(channel)
+        self.__channels[channel] = ChannelState(channel, activation_failures)
+        self.__inactive.add(channel)
+
+    def __remove_channel(self, channel: str):
+        self.__channels.pop(channel, None)
+        self.__active.discard(channel)
+        self.__inactive.discard(channel)
+        self.__banned.discard(channel)
+
     def __activate_channel(self, channel):
-        self.__channels[channel]["active"] = True
-        self.__channels[channel]["activation_failures"] = 0
+        state = self.__channels.get(channel)
+        if state is not None:
+            state.active = True
+            state.activation_failures = 0
+            self.__inactive.discard(channel)
+            self.__active.add(channel)
+            self.backoff.reset()
+        self.__resolve_join(channel, True)
+
+    def __pause_reading(self):
+        self.log.warning(f"Event queue is full ({self.events.depth} queued), pausing reading until handlers catch up.")
+        for transport in list(self.__readers):
+            transport.pause_reading()
+
+    def __resume_reading(self):
+        self.log.info(f"Event queue has drained, resuming reading.")
+        for transport in list(self.__readers):
+            transport.resume_reading()
+
+    def __deactivate_channel(self, channel):
+        state = self.__channels.get(channel)
+        if state is not None:
+            state.active = False
+            self.__active.discard(channel)
+            self.__inactive.add(channel)
+
+    def __ban_channel(self, channel):
+        state = self.__channels.get(channel)
+        if state is not None:
+            state.banned = True
+            self.__banned.add(channel)
+
+    def __suspend_channel(self, channel):
+        state = self.__channels.get(channel)
+        if state is not None:
+            state.activation_failures = 1000
 
     def __increment_message_counter(self, channel):
-        if channel in self.__message_counter.keys():
-            self.__message_counter[channel] += 1
-        else:
-            self.log.warn(f"Channel: `{channel}` attempted to increment the message counter, but channel cannot be found in the messagelist. Adding new entry.")
-            self.__message_counter[channel] = 1
-
-    async def __process_stream_message(self):
-        if not self.active:
+        state = self.__channels.get(channel)
+        if state is not None:
+            state.messages.hit()
+            self.__received.hit()
+
+    def _handle_line(self, line: str, transport: Transport = None):
+        """Called by the transport for every complete line received from the server."""
+        standby = False
+        if transport is not None and transport is not self.transport:
+            if transport is not self.__standby:
+                # a replaced connection, its channels are joined on the current one.
+                return
+            standby = True
+        self.log.debug(f" > {line}")
+        if line.startswith("PING"): # Keep Alive Mechanism
+            self._write_raw("PONG :tmi.twitch.tv", transport)
+            self.last_ping = datetime.now()
             return
         try:
-            if self.reader.at_eof():
-                self.log.warn("recieved EOF from server, will attempt to reconnect socket. Standby...")
-                await self.reconnect()
-            else:
-                self.buffer += (await self.reader.readline()).decode()
-            # self.buffer = self.buffer + (await self.loop.sock_recv(self.socket, 1024)).decode()
-        except ConnectionAbortedError as e:
-            self.log.info(f"Socket connection has Closed\nDetails below\n{type(e)}: {traceback.format_exc()}")
-            if self.active:
-                await self.reconnect()
-        except UnicodeDecodeError as e:
-            self.log.warning(f"Unicode Decode error detected, possible issue with the buffer.\nBuffer: [{self.buffer}]\n\nDetails below\n{type(e)}: {traceback.format_exc()}\n\nRegenerating buffer...")
-            self.buffer = ""
-            self.log.info(f"Buffer regeneration completed.")
-        except OSError as e:
-            self.log.warning(f"OSError detected, socket issue identitfied. Attempting to recover socket. Details below\n{type(e)}: {traceback.format_exc()}")
-            if self.active:
-                await self.reconnect()
-
-        temp = self.buffer.split("\n")
-        self.buffer = temp.pop()
-        for line in temp:
-            self.log.debug(f" > {line.strip()}")
-            if ("PING :tmi.twitch.tv" in line): # Keep Alive Mechanism
-                await self._send_raw("PONG :tmi.twitch.tv")
-                self.last_ping = datetime.now()
-                continue
-            self.loop.create_task(self.__process_line(line))
-            await asyncio.sleep(INTERVAL)
-
-    async def __process_line(self, line_text):
-        message = parse_line(line_text, self.command_activator)
+            self.__process_line(line, standby)
+        except Exception as e:
+            self.log.exception(f"Suppressing a caught an exception while processing the line `{line}`. Details below\n{type(e)}: {traceback.format_exc()}")
+
+    def __process_line(self, line_text, standby: bool = False):
+        message = parse_line(line_text, self.client.command_prefixes, self.client.lazy_messages)
+        if message.inner == "CommandMessage" and not self.client._is_command(message):
+            # prefixes other than the command activator only mark the commands registered with them, 
+            # anything else starting with one is ordinary chat.
+            message = parse_line(line_text, self.client.command_activator, self.client.lazy_messages)
         message.set_socket(self)
-        self.loop.create_task(self.client._scb_on_raw(message))
-
-        if message.inner == "Message":
-            self.loop.create_task(self.client._scb_on_message(message))
-        elif message.inner == "Join":
-            self.loop.create_task(self.client._scb_on_join(message))
-        elif message.inner == "Mode":
-            self.loop.create_task(self.client._scb_on_mode(message))
-        elif message.inner == "Names":
+        # the same message can arrive on more than one connection (a replacement connection, a 
+        # channel being migrated, whispers), those with an `id` are only processed once.
+        message_id = getattr(message, "id", None)
+        if message_id and message.inner == "Whisper":
+            # whisper ids are only counted within their thread, not across the whispers of every user.
+            message_id = (message.thread_id or message.user_id, message_id)
+        if message_id and self.client.dedup.seen(message_id):
+            return
+        if standby and not message_id:
+            # the rest is processed from the current connection until the replacement takes over.
+            if message.inner == "Names" or message.inner == "RoomState":
+                self.__resolve_standby_join(message.channel, True)
+            elif message.inner == "Notice" and message.message_id in JOIN_FAILURE_NOTICES:
+                self.__resolve_standby_join(message.channel, False)
+            return
+        event = EVENTS.get(message.inner)
+
+        if message.inner == "Names" or message.inner == "RoomState":
             self.__activate_channel(message.channel)
-            self.loop.create_task(self.client._scb_on_names(message))
-        elif message.inner == "Part":
-            self.loop.create_task(self.client._scb_on_part(message))
-        elif message.inner == "ClearChat":
-            self.loop.create_task(self.client._scb_on_clearchat(message))
-        elif message.inner == "ClearMessage":
-            self.loop.create_task(self.client._scb_on_clearmessage(message))
-        elif message.inner == "HostTarget":
-            self.loop.create_task(self.client._scb_on_hosttarget(message))
         elif message.inner == "Notice":
             if message.message_id == "msg_channel_suspended":
-                self.__channels[message.channel]["activation_failures"] = 1000
+                self.__suspend_channel(message.channel)
                 self.log.warn(f"Channel `{message.channel}` has been deleted or deactivated, a connection will not be retried. Please remove this channel from your channel list.")
             if message.message_id == "msg_banned":
-                self.__channels[message.channel]["banned"] = True
+                self.__ban_channel(message.channel)
                 self.log.warn(f"Channel `{message.channel}` has banned you. Please remove this channel from your channel list.")
-            self.loop.create_task(self.client._scb_on_notice(message))
+            if message.message_id in JOIN_FAILURE_NOTICES:
+                self.__resolve_join(message.channel, False)
         elif message.inner == "Reconnect":
-            self.loop.create_task(self.client._scb_on_reconnect(message))
-        elif message.inner == "RoomState":
-            self.loop.create_task(self.client._scb_on_roomstate(message))
+            if self.__replacement is None or self.__replacement.done():
+                self.__replacement = self.loop.create_task(self.__replace_connection())
         elif message.inner == "UserState":
-            self.loop.create_task(self.client._scb_on_userstate(message))
-            self.__increment_message_counter(message.channel)
-        elif message.inner == "GlobalUserState":
-            self.loop.create_task(self.client._scb_on_globaluserstate(message))
+            self.client.outbound.update_from_userstate(message)
             self.__increment_message_counter(message.channel)
-        elif message.inner == "UserNotice":
-            self.loop.create_task(self.client._scb_on_usernotice(message))
+        elif message.inner in ("UserNotice", "RitualUserNotice", "BitBadgeUpgradeUserNotice", "RaidUserNotice"):
             self.__increment_message_counter(message.channel)
-        elif message.inner == "RitualUserNotice":
-            self.loop.create_task(self.client._scb_on_ritual_usernotice(message))
-            self.__increment_message_counter(message.channel)
-        elif message.inner == "BitBadgeUpgradeUserNotice":
-            self.loop.create_task(self.client._scb_on_bitbadgeupgrade_usernotice(message))
-            self.__increment_message_counter(message.channel)
-        elif message.inner == "RaidUserNotice":
-            self.loop.create_task(self.client._scb_on_raid_usernotice(message))
-            self.__increment_message_counter(message.channel)
-        elif message.inner == "Whisper" and self.primary_socket:
-            self.log.info(f"[WHISPER]: ({message.display_name}) {message.message_text}")
-            self.loop.create_task(self.client._scb_on_whisper(message))
-            self.__increment_message_counter(message.channel)
-        elif message.inner == "SubscriberUserNotice":
-            if message.display_name.lower() != self.nick.lower():
-                self.loop.create_task(self.client._scb_on_subscriber_usernotice(message))
-            self.__increment_message_counter(message.channel)
-        elif message.inner == "GiftedSubscriberUserNotice":
-            if message.display_name.lower() != self.nick.lower():
-                self.loop.create_task(self.client._scb_on_giftedsubscriber_usernotice(message))
-            self.__increment_message_counter(message.channel)
-        elif message.inner == "PrivateMessage":
-            if message.display_name.lower() != self.nick.lower():
+        elif message.inner == "Whisper":
+            # whispers are delivered on every connection, without an `id` to deduplicate them by
+            # they are only processed on the primary socket.
+            if self.primary_socket or message_id:
+                self.log.info(f"[WHISPER]: ({message.display_name}) {message.message_text}")
+                self.__increment_message_counter(message.channel)
+            else:
+                event = None
+        elif message.inner in ("SubscriberUserNotice", "GiftedSubscriberUserNotice", "PrivateMessage", "CommandMessage"):
+            if message.display_name.lower() == self.nick.lower():
+                event = None
+            elif message.inner == "PrivateMessage":
                 self.log.info(f"[CHAT].[{message.channel}]: ({message.display_name}) {message.message_text}")
-                self.loop.create_task(self.client._scb_on_privmessage(message))
-            self.__increment_message_counter(message.channel)
-        elif message.inner == "CommandMessage":
-            if message.display_name.lower() != self.nick.lower():
+            elif message.inner == "CommandMessage":
                 self.log.info(f"[CMD].[{message.channel}]: ({message.display_name}) {message.message_text}")
-                self.loop.create_task(self.client._scb_on_command(message))
             self.__increment_message_counter(message.channel)
-        await asyncio.sleep(INTERVAL)
+
+        self.client._dispatch(message, event, self.events)
         
\ No newline at end of file
@@ -1,5 +1,7 @@
+import asyncio
 from datetime import datetime
 from jcore.exceptions import MissingRequiredParameterException
+from jcore.ratelimit import LANE_MODERATION
 
 class RawMessage():
     inner: str = "RawMessage"
@@ -7,92 +9,114 @@ class RawMessage():
     channel: str
     id: str
     message_time: datetime
-    __socket = None
+    __slots__ = ("line", "channel", "id", "message_time", "__socket", "_tags", "_decoders")
+
+    def __init__(self):
+        self.__socket = None
+        self._tags = None
+        self._decoders = None
 
 
     def __repr__(self):
         return f"[{self.inner}]: {self.line}"
 
+    def __getattr__(self, name: str):
+        # only reached for attributes that have not been set yet. Lazily parsed messages
+        # decode them from the tag section of their line on first access and keep the result.
+        if name.startswith("_") or self._decoders is None or name not in self._decoders:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        value = self._decoders[name](self._tags)
+        setattr(self, name, value)
+        return value
+
     def set_socket(self, socket):
         self.__socket = socket
 
+    @property
+    def socket(self):
+        """The socket the message was received on."""
+        return self.__socket
+
     async def _send(self, message_text: str):
-        await self.__socket.send(self.channel, message_text)
+        # the line is only queued, so handlers are not held up by the rate limits. The future
+        # resolves to `True` once the line has been written, see `Socket.send`.
+        return self.__socket.send(self.channel, message_text)
 
     async def _send_action(self, message_text: str):
-        await self.__socket.send(self.channel, f"/me {message_text}")
+        return self.__socket.send(self.channel, f"/me {message_text}")
 
     async def _ban(self, user, reason: str = "not provided"):
-        await self.__socket.send(self.channel, f"/ban {user} {reason}")
+        return self.__socket.send(self.channel, f"/ban {user} {reason}", LANE_MODERATION)
     
     async def _unban(self, user):
-        await self.__socket.send(self.channel, f"/unban {user}")
+        return self.__socket.send(self.channel, f"/unban {user}", LANE_MODERATION)
 
     async def _clear(self):
-        await self.__socket.send(self.channel, f"/clear")
+        return self.__socket.send(self.channel, f"/clear", LANE_MODERATION)
 
     async def _commercial(self, seconds: int = 30):
-        await self.__socket.send(self.channel, f"/commercial {seconds}")
+        return self.__socket.send(self.channel, f"/commercial {seconds}")
     
     async def _delete(self):
-        await self.__socket.send(self.channel, f"/delete {self.id}")
+        return self.__socket.send(self.channel, f"/delete {self.id}", LANE_MODERATION)
 
     async def _emote_only(self):
-        await self.__socket.send(self.channel, f"/emoteonly")
+        return self.__socket.send(self.channel, f"/emoteonly", LANE_MODERATION)
     
     async def _emote_only_off(self):
-        await self.__socket.send(self.channel, f"/emoteonlyoff")
+        return self.__socket.send(self.channel, f"/emoteonlyoff", LANE_MODERATION)
 
     async def _followers(self, duration:str):
-        await self.__socket.send(self.channel, f"/followers {duration}")
+        return self.__socket.send(self.channel, f"/followers {duration}", LANE_MODERATION)
     
     async def _followers_off(self):
-        await self.__socket.send(self.channel, f"/followersoff")
+        return self.__socket.send(self.channel, f"/followersoff", LANE_MODERATION)
     
     async def _host(self, channel: str = ""):
-        await self.__socket.send(self.channel, f"/host {channel}")
+        return self.__socket.send(self.channel, f"/host {channel}")
     
     async def _host_off(self):
-        await self.__socket.send(self.channel, f"/unhost")
+        return self.__socket.send(self.channel, f"/unhost")
 
     async def _marker(self, description: str = "undefined"):
-        await self.__socket.send(self.channel, f"/marker {description}")
+        return self.__socket.send(self.channel, f"/marker {description}")
 
     async def _raid(self, channel: str = ""):
-        await self.__socket.send(self.channel, f"/raid {channel}")
+        return self.__socket.send(self.channel, f"/raid {channel}")
     
     async def _raid_off(self):
-        await self.__socket.send(self.channel, f"/unraid")
+        return self.__socket.send(self.channel, f"/unraid")
 
     async def _slow(self, seconds: int = 2):
-        await self.__socket.send(self.channel, f"/slow {seconds}")
+        return self.__socket.send(self.channel, f"/slow {seconds}", LANE_MODERATION)
     
     async def _slow_off(self):
-        await self.__socket.send(self.channel, f"/slowoff")
+        return self.__socket.send(self.channel, f"/slowoff", LANE_MODERATION)
 
     async def _subscribers(self):
-        await self.__socket.send(self.channel, f"/subscribers")
+        return self.__socket.send(self.channel, f"/subscribers", LANE_MODERATION)
     
     async def _subscribers_off(self):
-        await self.__socket.send(self.channel, f"/subscribersoff")
+        return self.__socket.send(self.channel, f"/subscribersoff", LANE_MODERATION)
 
     async def _timeout(self, user, duration:int = 0, reason: str = "not provided"):
-        await self.__socket.send(self.channel, f"/timeout {user} {duration} {reason}")
+        return self.__socket.send(self.channel, f"/timeout {user} {duration} {reason}", LANE_MODERATION)
     
     async def _untimeout(self, user):
-        await self.__socket.send(self.channel, f"/untimeout {user}")
+        return self.__socket.send(self.channel, f"/untimeout {user}", LANE_MODERATION)
 
     async def _unique_chat(self):
-        await self.__socket.send(self.channel, f"/uniquechat")
+        return self.__socket.send(self.channel, f"/uniquechat", LANE_MODERATION)
     
     async def _unique_chat_off(self):
-        await self.__socket.send(self.channel, f"/uniquechatoff")
+        return self.__socket.send(self.channel, f"/uniquechatoff", LANE_MODERATION)
     
     
 
 class Message(RawMessage):
     message: str
     inner:str = "Message"
+    __slots__ = ("message",)
     pass
 
     def __repr__(self):
@@ -104,53 +128,61 @@ class Message(RawMessage):
 
 class Join(RawMessage):
     inner:str = "Join"
+    __slots__ = ("user",)
     user:str
     pass
 
     def __repr__(self):
         return f"[{self.inner}]: `{self.user}` joined channel: `{self.channel}` => {self.line}"
 
-    async def send(self, message_text: str):
-        """Send a message to the chat"""
-        await self._send(message_text)
+    async def send(self, message_text: str) -> asyncio.Future:
+        """Send a message to the chat. Returns as soon as the message is queued within the client's
+        rate limits, with a future that resolves to `True` once it has been written."""
+        return await self._send(message_text)
 
     async def send_action(self, message_text: str):
         """Send an 'action' message to the chat"""
-        await self._send_action(message_text)
+        return await self._send_action(message_text)
 
     
 
 class Mode(RawMessage):
     inner:str = "Mode"
+    __slots__ = ()
     pass
 
 class Names(RawMessage):
     inner:str = "Names"
+    __slots__ = ()
     pass
 
 class Part(RawMessage):
     inner:str = "Part"
+    __slots__ = ("user",)
     user:str
     pass
 
     def __repr__(self):
         return f"[{self.inner}]: `{self.user}` departed channel: `{self.channel}` => {self.line}"
 
-    async def send(self, message_text: str):
-        """Send a message to the chat"""
-        await self._send(message_text)
+    async def send(self, message_text: str) -> asyncio.Future:
+        """Send a message to the chat. Returns as soon as the message is queued within the client's
+        rate limits, with a future that resolves to `True` once it has been written."""
+        return await self._send(message_text)
 
     async def send_action(self, message_text: str):
         """Send an 'action' message to the chat"""
-        await self._send_action(message_text)
+        return await self._send_action(message_text)
 
 
 class Whisper(RawMessage):
     inner: str = "Whisper"
+    __slots__ = ("badges", "color", "display_name", "emotes", "thread_id", "user_id", "message_text")
     badges: dict
     color: str
     display_name: str
     emotes: list
+    thread_id: str
     user_id: str
     message_text: str
     channel: str
@@ -173,7 +205,7 @@ class Whisper(RawMessage):
         """
         if message_text == "" or message_text is None:
             raise MissingRequiredParameterException("parameter `message_text` is required")
-        await self._send(f"/w {self.display_name.lower()} {message_text}")
+        return await self._send(f"/w {self.display_name.lower()} {message_text}")
 
 
 
@@ -183,6 +215,7 @@ class Whisper(RawMessage):
 
 class ClearChat(RawMessage):
     inner: str = "ClearChat"
+    __slots__ = ("target_all", "ban_duration")
     target_all: bool
     ban_duration: int
     channel: str
@@ -195,26 +228,31 @@ Channel: {self.channel}
 
 class ClearMessage(Message):
     inner: str = "ClearMessage"
+    __slots__ = ("login", "target_message_id")
     login: str
     target_message_id: str
     pass
 
 class HostTarget(RawMessage):
     inner: str = "HostTarget"
+    __slots__ = ("number_of_viewers",)
     number_of_viewers: int
     pass
 
 class Notice(Message):
     inner: str = "Notice"
+    __slots__ = ("message_id",)
     message_id: str
     pass
 
 class Reconnect(RawMessage):
     inner: str = "Reconnect"
+    __slots__ = ()
     pass
 
 class RoomState(RawMessage):
     inner: str = "RoomState"
+    __slots__ = ("emote_only", "follower_only", "r9k", "slow", "subs_only")
     emote_only: bool
     follower_only: bool
     r9k: bool
@@ -241,6 +279,7 @@ class UserState(RawMessage):
     info: https://dev.twitch.tv/docs/irc/tags#userstate-twitch-tags
     """
     inner: str = "UserState"
+    __slots__ = ("badge_info", "badges", "color", "display_name", "emote_set", "mod")
     badge_info: str
     badges: list
     color: str
@@ -269,6 +308,7 @@ class GlobalUserState(RawMessage):
     info: https://dev.twitch.tv/docs/irc/tags#globaluserstate-twitch-tags
     """
     inner: str = "GlobalUserState"
+    __slots__ = ("badge_info", "badges", "color", "display_name", "emote_set", "user_id")
     badge_info: dict
     badges: dict
     color: str
@@ -285,6 +325,7 @@ class PrivateMessage(RawMessage):
     info: https://dev.twitch.tv/docs/irc/tags#privmsg-twitch-tags
     """
     inner: str = "PrivateMessage"
+    __slots__ = ("badge_info", "badges", "bits", "color", "display_name", "emotes", "mod", "sub", "room_id", "sent_timestamp", "user_id", "message_text")
     badge_info: dict
     badges: dict
     bits: int
@@ -318,13 +359,14 @@ Message Text: {self.message_text}
 """
 
 
-    async def send(self, message_text: str):
-        """Send a message to the chat"""
-        await self._send(message_text)
+    async def send(self, message_text: str) -> asyncio.Future:
+        """Send a message to the chat. Returns as soon as the message is queued within the client's
+        rate limits, with a future that resolves to `True` once it has been written."""
+        return await self._send(message_text)
 
     async def send_action(self, message_text: str):
         """Send an 'action' message to the chat"""
-        await self._send_action(message_text)
+        return await self._send_action(message_text)
 
     async def ban(self, user: str, reason: str = "not provided"):
         """Ban a user from the chat  
@@ -342,7 +384,7 @@ Message Text: {self.message_text}
         """
         if user == "" or user is None:
             raise MissingRequiredParameterException("parameter `user` is required")
-        await self._ban(user, reason)
+        return await self._ban(user, reason)
     
     async def unban(self, user: str):
         """Un-Ban a user from the chat  
@@ -359,13 +401,13 @@ Message Text: {self.message_text}
         """
         if user == "" or user is None:
             raise MissingRequiredParameterException("parameter `user` is required")
-        await self._unban(user)
+        return await self._unban(user)
 
     async def clear(self):
         """Clear messages for all users from chat.
         
         Required Scope: `channel:moderate`"""
-        await self._clear()
+        return await self._clear()
 
     async def commercial(self, seconds: int = 30):
         """Roll commercial for Affiliates and Partners
@@ -375,25 +417,25 @@ Message Text: {self.message_text}
         Parameters:
         -----------
             - `seconds` (optional): run a commercial for {30|60|90|120|150|180} seconds | Default 30"""
-        await self._commercial(seconds)
+        return await self._commercial(seconds)
     
     async def delete(self):
         """Delete the message from chat for all users
         
         Required Scope: `channel:moderate`"""
-        await self._delete()
+        return await self._delete()
 
     async def emote_only(self):
         """Enable "emote only" mode for chat.
         
         Required Scope: `channel:moderate`"""
-        await self._emote_only()
+        return await self._emote_only()
     
     async def emote_only_off(self):
         """Disable "emote only" mode for chat
         
         Required Scope: `channel:moderate`"""
-        await self._emote_only_off()
+        return await self._emote_only_off()
 
     async def followers(self, duration:str = ""):
         """Enable "follower only" mode for chat.
@@ -405,13 +447,13 @@ Message Text: {self.message_text}
             - `duration` (optional): minimum number of minutes a user must follow 
             the channel before they are able to send messages.
         """
-        await self._followers(duration)
+        return await self._followers(duration)
     
     async def followers_off(self):
         """Disable "follower only" mode for chat.
         
         Required Scope: `channel:moderate`"""
-        await self._followers_off()
+        return await self._followers_off()
     
     async def host(self, channel: str):
         """Enable hosting for another channel
@@ -429,14 +471,14 @@ Message Text: {self.message_text}
 
         if channel == "" or channel is None:
             raise MissingRequiredParameterException("parameter `channel` is required")
-        await self._host(channel)
+        return await self._host(channel)
     
     async def host_off(self):
         """Disable hosting of another channel  
         
         Required Scope: `channel_editor`
         """
-        await self._host_off()
+        return await self._host_off()
 
     async def marker(self, description: str = "undefined"):
         """Adds a stream marker (with an optional description, max 140 characters) 
@@ -448,7 +490,7 @@ Message Text: {self.message_text}
         ----------
             - `description` (optional): description, max 140 characters.
         """
-        await self._marker(description)
+        return await self._marker(description)
 
     async def raid(self, channel: str = ""):
         """Start a raid on another channel when the stream ends
@@ -466,14 +508,14 @@ Message Text: {self.message_text}
 
         if channel == "" or channel is None:
             raise MissingRequiredParameterException("parameter `channel` is required")
-        await self._raid(channel)
+        return await self._raid(channel)
     
     async def raid_off(self):
         """Disable or cancel the raid on another channel  
         
         Required Scope: `channel_editor`
         """
-        await self._raid_off()
+        return await self._raid_off()
 
     async def slow(self, seconds: int = 2):
         """Limit how frequently users can send messages in Chat
@@ -483,25 +525,25 @@ Message Text: {self.message_text}
         Parameters
         ----------
             - `seconds` (optional): the minimum number of seconds between messages."""
-        await self._slow(seconds)
+        return await self._slow(seconds)
     
     async def slow_off(self):
         """Turn off slow mode
         
         Required Scope: `channel:moderate`"""
-        await self._slow_off()
+        return await self._slow_off()
 
     async def subscribers(self):
         """Restrict chat to subscribers  
         
         Required Scope: `channel:moderate`"""
-        await self._subscribers()
+        return await self._subscribers()
     
     async def subscribers_off(self):
         """Turn off subscriber-only mode
         
         Required Scope: `channel:moderate`"""
-        await self._subscribers_off()
+        return await self._subscribers_off()
 
     async def timeout(self, user, duration:int = 0, reason: str = "not provided"):
         """Temporarily ban a user from Chat
@@ -521,7 +563,7 @@ Message Text: {self.message_text}
         """
         if user == "" or user is None:
             raise MissingRequiredParameterException("parameter `user` is required")
-        await self._timeout(user, duration, reason)
+        return await self._timeout(user, duration, reason)
     
     async def untimeout(self, user):
         """Remove a timeout on a user
@@ -539,21 +581,21 @@ Message Text: {self.message_text}
         """
         if user == "" or user is None:
             raise MissingRequiredParameterException("parameter `user` is required")
-        await self._untimeout(user)
+        return await self._untimeout(user)
 
     async def unique_chat(self):
         """Prevent users from sending duplicate messages in Chat
         
         Required Scope: `channel:moderate`
         """
-        await self._unique_chat()
+        return await self._unique_chat()
     
     async def unique_chat_off(self):
         """Turn off unique-chat mode
         
         Required Scope: `channel:moderate`
         """
-        await self._unique_chat_off()
+        return await self._unique_chat_off()
 
     async def whisper(self, user: str,  message_text:str):
         """Send a whisper to a user.
@@ -572,7 +614,7 @@ Message Text: {self.message_text}
             raise MissingRequiredParameterException("parameter `user` is required")
         if message_text == "" or message_text is None:
             raise MissingRequiredParameterException("parameter `message_text` is required")
-        await self._send(f"/w {user.lower()} {message_text}")
+        return await self._send(f"/w {user.lower()} {message_text}")
 
 
 
@@ -588,6 +630,7 @@ class UserNotice(PrivateMessage):
     info: https://dev.twitch.tv/docs/irc/tags#usernotice-twitch-tags
     """
     inner: str = "UserNotice"
+    __slots__ = ("login", "msg_id", "system_message")
     login: str
     msg_id: str
     system_message: str
@@ -616,11 +659,13 @@ System Message: {self.system_message}
 
 class RitualUserNotice(UserNotice):
     inner: str = "RitualUserNotice"
+    __slots__ = ("ritual_name",)
     ritual_name: str
     pass
 
 class BitBadgeUpgradeUserNotice(UserNotice):
     inner: str = "BitBadgeUpgradeUserNotice"
+    __slots__ = ("threshold",)
     threshold: int
     pass
 
@@ -629,6 +674,7 @@ class RaidUserNotice(UserNotice):
     A UserNotice Object for Raids
     """
     inner: str = "RaidUserNotice"
+    __slots__ = ("raider_display_name", "raider_login", "viewer_count")
     raider_display_name: str
     raider_login: str
     viewer_count: int
@@ -638,6 +684,7 @@ class SubscriberUserNotice(UserNotice):
     A UserNotice Object for Subscription or Re-subscription Events
     """
     inner: str = "SubscriberUserNotice"
+    __slots__ = ("cumulative_months", "share_streak", "streak_months", "sub_plan", "sub_plan_name")
     cumulative_months: int
     share_streak: bool
     streak_months: int
@@ -674,6 +721,7 @@ class GiftedSubscriberUserNotice(UserNotice):
     A UserNotice Object for Gifted Subs, included Anonyumous Gifts.
     """
     inner: str = "GiftedSubscriberUserNotice"
+    __slots__ = ("cumulative_months", "anonymous", "promo_gift_total", "promo_name", "mass_gift_count", "recipient_display_name", "recipient_id", "recipient_login", "sender_login", "sender_display_name", "sender_count", "sub_plan", "sub_plan_name")
     cumulative_months: int
     anonymous: bool
     # active_promo: bool
@@ -727,7 +775,9 @@ class CommandMessage(PrivateMessage):
     KEYWORD: str
     args: list    
     inner: str = "CommandMessage"
+    __slots__ = ("KEYWORD", "args", "args_len", "prefix")
     args_len: int
+    prefix: str
     
 
     def __repr__(self):
@@ -746,6 +796,7 @@ Sent Timestamp: {self.sent_timestamp}
 User-ID: {self.user_id}
 Channel: {self.channel}
 Message Text: {self.message_text}
+Prefix: {self.prefix}
 Keyword: {self.KEYWORD}
 """
 
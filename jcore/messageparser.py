@@ -2,61 +2,23 @@ from .message import *
 from datetime import datetime
 import re
 
-def parse_line(line: str, command_activator: str) -> RawMessage:
-    """Parse a raw line coming in and return a Message Object"""
+def parse_line(line: str, command_activator, lazy: bool = False) -> RawMessage:
+    """Parse a raw line coming in and return a Message Object
     
-    pattern = re.compile(":[a-z0-9_]+![a-z0-9_]+@[a-z0-9_]+.tmi.twitch.tv JOIN #")
-    if pattern.match(line): #join
-        return __parse_join(line)
-    pattern = re.compile(":[a-z0-9_]+![a-z0-9_]+@[a-z0-9_]+.tmi.twitch.tv PART #")
-    if pattern.match(line): #part
-        return __parse_part(line)
-    pattern = re.compile(":[a-z0-9_]+.tmi.twitch.tv 3(53|66)")
-    if pattern.match(line): #names
-        return __parse_names(line)
-    pattern = re.compile(":tmi.twitch.tv USERSTATE")
-    if pattern.search(line): #user state
-        return __parse_userstate(line)
-    
-    pattern = re.compile(":tmi.twitch.tv ROOMSTATE")
-    if pattern.search(line): #room state
-        return __parse_roomstate(line)
-
-    pattern = re.compile(":[a-z0-9_]+![a-z0-9_]+@[a-z0-9_]+.tmi.twitch.tv PRIVMSG")
-    if pattern.search(line): #Private Message
-        return __parse_privatemessage(line, command_activator)
-    
-    pattern = re.compile(":tmi.twitch.tv CLEARCHAT")
-    if pattern.search(line): #Clear Chat
-        return __parse_clearchat(line)
-    
-    pattern = re.compile(":tmi.twitch.tv CLEARMSG")
-    if pattern.search(line): #Clear Message
-        return __parse_clearchat(line)
-
-    pattern = re.compile(":tmi.twitch.tv GLOBALUSERSTATE")
-    if pattern.search(line): #Global user state
-        return __parse_globaluserstate(line)
-    
-
-    pattern = re.compile(":tmi.twitch.tv USERNOTICE")
-    if pattern.search(line): #user notice
-        return __parse_usernotice(line)
-
-    pattern = re.compile(":tmi.twitch.tv USERSTATE")
-    if pattern.search(line): #user state
-        return __parse_usernotice(line)
-    
-    pattern = re.compile(".tmi.twitch.tv WHISPER")
-    if pattern.search(line): #user state
-        return __parse_whisper(line)
-
-    pattern = re.compile(".tmi.twitch.tv NOTICE")
-    if pattern.search(line): #user state
-        return __parse_notice(line)
-
-
-
+    `command_activator` is the prefix that marks a chat message as a command, or a 
+    tuple of prefixes (longest first) when commands use more than one prefix.
+    When `lazy` is set, chat messages and user notices only keep where their tags are in 
+    the line, and decode each attribute from the line the first time it is read."""
+    tags_end, prefix, command, params = __split_line(line)
+
+    # chat messages are the hot path, so they are checked ahead of the table lookup
+    if command == "PRIVMSG":
+        return __parse_privatemessage(line, __get_tags(line, tags_end, lazy), prefix, params, command_activator, lazy)
+    if command == "USERNOTICE":
+        return __parse_usernotice(line, __get_tags(line, tags_end, lazy), prefix, params, lazy)
+    parser = __PARSERS.get(command)
+    if parser is not None:
+        return parser(line, __get_tags(line, tags_end, False), prefix, params)
 
     # Fallthrough case
     msg = RawMessage()
@@ -64,292 +26,417 @@ def parse_line(line: str, command_activator: str) -> RawMessage:
     msg.message_time = datetime.now()
     return msg
 
-def __parse_whisper(line:str) -> Whisper:
+def __parse_whisper(line: str, tags: dict, prefix: str, params: list) -> Whisper:
     msg = Whisper()
     msg.line = line
     msg.message_time = datetime.now()
-    msg.badges = [re.sub(r"\/\d","", badge) for badge in __get_list(line, "badges")]
-    msg.color = __get_single(line, "color")
-    msg.display_name = __get_single(line, "display-name")
-    msg.emotes = __get_list(line, "emotes")
-    msg.id = __get_single(line, "id")
-    msg.user_id = __get_single(line, "user-id")
-    msg.message_text = __get_whisper_message(line)
-    msg.channel = __get_whisper_channel(line)
+    msg.badges = __get_badges(tags)
+    msg.color = __get_single(tags, "color")
+    msg.display_name = __get_single(tags, "display-name")
+    msg.emotes = __get_list(tags, "emotes")
+    msg.id = __get_single(tags, "message-id")
+    msg.thread_id = __get_single(tags, "thread-id")
+    msg.user_id = __get_single(tags, "user-id")
+    msg.message_text = __get_trailing(params)
+    msg.channel = params[0] if params else None
     return msg
 
-def __parse_notice(line: str) -> Notice:
+def __parse_notice(line: str, tags: dict, prefix: str, params: list) -> Notice:
     msg = Notice()
     msg.line = line
     msg.message_time = datetime.now()
-    msg.channel = __get_channel(line, "NOTICE")
-    msg.message_id = str(line.split("msg-id=")[1]).split(" ")[0]
+    msg.channel = __get_channel(params)
+    msg.message_id = __get_single(tags, "msg-id")
     return msg
 
-def __parse_userstate(line: str) -> UserState:
-    msg = UserState()
-    msg.line = line
-    msg.message_time = datetime.now()
-    msg.badge_info = __get_single(line, "badge-info")
-    msg.badges = [re.sub(r"\/\d","", badge) for badge in __get_list(line, "badges")]
-    msg.color = __get_single(line, "color")
-    msg.display_name = __get_single(line, "display-name")
-    msg.emote_set = __get_list(line, "emote-set")
-    msg.channel = __get_channel(line, "USERSTATE")
-    msg.mod = "1" == __get_single(line, "mod")
-    return msg
 
-
-def __parse_usernotice(line: str) -> UserNotice:
-    notice_type = __get_single(line, "msg-id")
+def __parse_usernotice(line: str, tags: dict, prefix: str, params: list, lazy: bool) -> UserNotice:
+    notice_type = __get_single(tags, "msg-id")
     if notice_type in ("sub", "resub"):
         msg = SubscriberUserNotice()
-        msg.cumulative_months = __get_single_int(line, "msg-param-cumulative-months")
-        msg.streak_months = __get_single_int(line, "msg-param-streak-months")   
-        msg.share_streak = __get_single(line, "msg-param-should-share-streak") == 1
-        msg.sub_plan = __get_single(line, "msg-param-sub-plan")
-        msg.sub_plan_name = __get_single(line, "msg-param-sub-plan-name")
-        if msg.sub_plan_name is not None:
-            msg.sub_plan_name = msg.sub_plan_name.replace("\s", " ")
+        decoders = __SUBSCRIBER_DECODERS
     elif notice_type in ("subgift","anonsubgift","submysterygift", "giftpaidupgrade", "rewardgift", "anongiftpaidupgrade"):
         msg = GiftedSubscriberUserNotice()
-        if notice_type in ("anonsubgift","submysterygift", "anongiftpaidupgrade"):
-            msg.anonymous = True
-        else:
-            msg.anonymous = False
-        msg.sub_plan = __get_single(line, "msg-param-sub-plan")
-        msg.sub_plan_name = __get_single(line, "msg-param-sub-plan-name")
-        if msg.sub_plan_name is not None:
-            msg.sub_plan_name = msg.sub_plan_name.replace("\s", " ")
-        msg.cumulative_months = __get_single_int(line, "msg-param-months")
-        msg.promo_gift_total = __get_single_int(line, "msg-param-promo-gift-total")
-        msg.mass_gift_count = __get_single_int(line, "msg-param-mass-gift-count")
-        msg.sender_count = __get_single_int(line, "msg-param-sender-count")
-        msg.promo_name = __get_single(line, "msg-param-promo-name")
-        msg.recipient_display_name = __get_single(line, "msg-param-recipient-display-name")
-        if msg.recipient_display_name is None:
-            msg.recipient_display_name = __get_single(line, "display-name")
-        msg.recipient_login = __get_single(line, "msg-param-recipient-user-name")
-        msg.recipient_id = __get_single(line, "msg-param-recipient-id")
-        if msg.recipient_id is None:
-            msg.recipient_id = __get_single(line, "msg-param-recipient-id")
-        if msg.anonymous:
-            msg.sender_login = "unknown"
-            msg.sender_display_name = "Some Anonymous Legend"
-        else:
-            if msg.mass_gift_count > 1 or notice_type in ("giftpaidupgrade","anongiftpaidupgrade"):
-                msg.sender_login = __get_single(line, "msg-param-sender-login")
-                msg.sender_display_name = __get_single(line, "msg-param-sender-name")
-            else:
-                msg.sender_login = __get_single(line, "login")
-                msg.sender_display_name = __get_single(line, "display-name")
-
+        decoders = __GIFTED_SUBSCRIBER_DECODERS
     elif notice_type in ("raid", "unraid"):
         msg = RaidUserNotice()
-        msg.raider_display_name = __get_single(line, "msg-param-displayName")
-        msg.raider_login = __get_single(line, "msg-param-login")
-        msg.viewer_count = __get_single_int(line, "msg-param-viewerCount")
-        
+        decoders = __RAID_DECODERS
     elif notice_type == "ritual":
         msg = RitualUserNotice()
-        msg.ritual_name = __get_single(line, "msg-param-ritual-name")
+        decoders = __RITUAL_DECODERS
     elif notice_type == "bitsbadgetier":
         msg = BitBadgeUpgradeUserNotice()
-        msg.threshold = __get_single(line, "msg-param-threshold")
+        decoders = __BIT_BADGE_UPGRADE_DECODERS
     else:
         msg = UserNotice()
+        decoders = __USERNOTICE_DECODERS
     
     msg.line = line
     msg.message_time = datetime.now()
-    msg.badge_info = __get_single(line, "badge-info")
-    msg.badges = [re.sub(r"\/\d","", badge) for badge in __get_list(line, "badges")]
-    msg.bits = __get_single(line, "bits")
-    msg.color = __get_single(line, "color")
-    msg.display_name = __get_single(line, "display-name")
-    msg.emotes = __get_list(line, "emotes")
-    msg.id = __get_single(line, "id")
-    msg.room_id = __get_single(line, "room-id")
-    msg.sent_timestamp = __get_time_from_timestamp(line)
-    msg.user_id = __get_single(line, "user-id")
-    msg.mod = "1" == __get_single(line, "mod") or msg.room_id == msg.user_id
-    msg.message_text = __get_message(line, "USERNOTICE")
-    msg.channel = __get_channel(line, "USERNOTICE")
-    msg.sub = "subscriber" in msg.badge_info
-    msg.system_message = __get_single(line, "system-msg").replace("\s", " ")
-    msg.login = __get_single(line, "login")
+    msg.message_text = __get_trailing(params)
+    msg.channel = __get_channel(params)
+    __apply_decoders(msg, tags, decoders, lazy)
     return msg
 
 
-def __parse_globaluserstate(line: str) -> GlobalUserState:
+def __parse_globaluserstate(line: str, tags: dict, prefix: str, params: list) -> GlobalUserState:
     msg = GlobalUserState()
     msg.line = line
     msg.message_time = datetime.now()
-    msg.badge_info = __get_single(line, "badge-info")
-    msg.badges = [re.sub(r"\/\d","", badge) for badge in __get_list(line, "badges")]
-    msg.color = __get_single(line, "color")
-    msg.display_name = __get_single(line, "display-name")
-    msg.emote_set = __get_list(line, "emote-set")
-    msg.user_id = __get_single(line, "user-id")
+    msg.badge_info = __get_single(tags, "badge-info")
+    msg.badges = __get_badges(tags)
+    msg.color = __get_single(tags, "color")
+    msg.display_name = __get_single(tags, "display-name")
+    msg.emote_set = __get_list(tags, "emote-sets")
+    msg.user_id = __get_single(tags, "user-id")
     return msg
 
 
-def __parse_clearmsg(line: str) -> ClearMessage:
+def __parse_clearmsg(line: str, tags: dict, prefix: str, params: list) -> ClearMessage:
     msg = ClearMessage()
     msg.line = line
     msg.message_time = datetime.now()
-    msg.message = __get_message(line, "CLEARMSG")
-    msg.login = __get_single(line, "login")
-    msg.target_message_id = __get_single(line, "target-msg-id")
+    msg.channel = __get_channel(params)
+    msg.message = __get_trailing(params)
+    msg.login = __get_single(tags, "login")
+    msg.target_message_id = __get_single(tags, "target-msg-id")
     return msg
 
-def __parse_clearchat(line: str) -> ClearChat:
+def __parse_clearchat(line: str, tags: dict, prefix: str, params: list) -> ClearChat:
     msg = ClearChat()
     msg.line = line
     msg.message_time = datetime.now()
-    msg.channel = __get_channel(line, "CLEARCHAT")
-    msg.ban_duration = __get_single(line, "ban-duration")
+    msg.channel = __get_channel(params)
+    msg.ban_duration = __get_single(tags, "ban-duration")
     return msg
 
 
-def __parse_privatemessage(line: str, command_activator: str) -> PrivateMessage:
-    t = __get_message(line, "PRIVMSG")
-    if t[0] == command_activator:
+def __parse_privatemessage(line: str, tags: dict, prefix: str, params: list, command_activator, lazy: bool) -> PrivateMessage:
+    t = __get_trailing(params)
+    if t and t.startswith(command_activator):
         msg = CommandMessage()
-        msg.args = t[1:].lower().split(" ")
+        msg.prefix = __get_command_prefix(t, command_activator)
+        msg.args = t[len(msg.prefix):].lower().split(" ")
         msg.args_len = len(msg.args)
         msg.KEYWORD = msg.args[0].strip("\"\'\\")
     else:
         msg = PrivateMessage()
-    msg.channel = __get_channel(line, "PRIVMSG")
-    msg.message_text = __get_message(line, "PRIVMSG")
+    msg.channel = __get_channel(params)
+    msg.message_text = t
     msg.line = line
     msg.message_time = datetime.now()
-    msg.badge_info = __get_single(line, "badge-info")
-    msg.badges = [re.sub(r"\/\d","", badge) for badge in __get_list(line, "badges")]
-    msg.bits = __get_single(line, "bits")
-    msg.color = __get_single(line, "color")
-    msg.display_name = __get_single(line, "display-name")
-    msg.emotes = __get_list(line, "emotes")
-    msg.id = __get_single(line, "id")
-    msg.room_id = __get_single(line, "room-id")
-    msg.sent_timestamp = __get_time_from_timestamp(line)
-    msg.user_id = __get_single(line, "user-id")
-    msg.mod = "1" == __get_single(line, "mod") or msg.room_id == msg.user_id
-    msg.sub = "subscriber" in msg.badge_info
-
+    __apply_decoders(msg, tags, __PRIVMSG_DECODERS, lazy)
     return msg
 
 
 
-def __parse_roomstate(line: str) -> RoomState:
+def __parse_roomstate(line: str, tags: dict, prefix: str, params: list) -> RoomState:
     msg = RoomState()
     msg.line = line
     msg.message_time = datetime.now()
-    msg.channel = line.split("ROOMSTATE #", 1)[1].replace("\r","")
-    msg.emote_only = "1" == __get_single(line, "emote-only")
-    msg.follower_only = __get_single_int(line, "followers-only", default = -1) > -1
-    msg.r9k = "1" == __get_single(line, "r9k")
-    msg.slow = __get_single_int(line, "slow", default = -1, end=" ")
-    msg.subs_only = "1" == __get_single(line, "subs-only")
+    msg.channel = __get_channel(params)
+    msg.emote_only = "1" == __get_single(tags, "emote-only")
+    msg.follower_only = __get_single_int(tags, "followers-only", default = -1) > -1
+    msg.r9k = "1" == __get_single(tags, "r9k")
+    msg.slow = __get_single_int(tags, "slow", default = -1)
+    msg.subs_only = "1" == __get_single(tags, "subs-only")
     return msg
 
-def __parse_userstate(line: str) -> UserState:
+def __parse_userstate(line: str, tags: dict, prefix: str, params: list) -> UserState:
     msg = UserState()
     msg.line = line
     msg.message_time = datetime.now()
-    msg.badge_info = __get_single(line, "badge-info")
-    msg.badges = [re.sub(r"\/\d","", badge) for badge in __get_list(line, "badges")]
-    msg.display_name = __get_single(line, "display-name")
-    msg.mod = "1" == __get_single(line, "mod")
-    msg.emote_set = __get_list(line, "emote-sets")
-    msg.channel = __get_channel(line, "USERSTATE")
+    msg.badge_info = __get_single(tags, "badge-info")
+    msg.badges = __get_badges(tags)
+    msg.color = __get_single(tags, "color")
+    msg.display_name = __get_single(tags, "display-name")
+    msg.mod = "1" == __get_single(tags, "mod")
+    msg.emote_set = __get_list(tags, "emote-sets")
+    msg.channel = __get_channel(params)
     return msg
 
-def __parse_join(line: str) -> Join:
+def __parse_join(line: str, tags: dict, prefix: str, params: list) -> Join:
     msg = Join()
     msg.message_time = datetime.now()
     msg.line = line
-    msg.channel = __get_channel(line, "JOIN")
-    try:
-        msg.user = line.split(":")[1].split("!")[0]
-    except:
-        msg.user = None
+    msg.channel = __get_channel(params)
+    msg.user = __get_user(prefix)
     return msg
 
-def __parse_part(line: str) -> Join:
+def __parse_part(line: str, tags: dict, prefix: str, params: list) -> Part:
     msg = Part()
     msg.message_time = datetime.now()
     msg.line = line
-    msg.channel = line.split("#")[1].strip()
-    try:
-        msg.user = line.split(":")[1].split("!")[0]
-    except:
-        msg.user = None
+    msg.channel = __get_channel(params)
+    msg.user = __get_user(prefix)
+    return msg
+
+def __parse_reconnect(line: str, tags: dict, prefix: str, params: list) -> Reconnect:
+    msg = Reconnect()
+    msg.line = line
+    msg.message_time = datetime.now()
+    msg.channel = None
     return msg
 
-def __parse_names(line: str) -> Names:
+def __parse_names(line: str, tags: dict, prefix: str, params: list) -> Names:
     msg = Names()
     msg.line = line
     msg.message_time = datetime.now()
-    msg.channel = line.split("#")[1].split(" ")[0].strip()
+    # 353 carries a channel-type marker ahead of the channel, 366 does not
+    msg.channel = next((param[1:] for param in params if param.startswith("#")), None)
     return msg
 
 
+__PARSERS = {
+    "JOIN": __parse_join,
+    "PART": __parse_part,
+    "353": __parse_names,
+    "366": __parse_names,
+    "USERSTATE": __parse_userstate,
+    "ROOMSTATE": __parse_roomstate,
+    "CLEARCHAT": __parse_clearchat,
+    "CLEARMSG": __parse_clearmsg,
+    "GLOBALUSERSTATE": __parse_globaluserstate,
+    "WHISPER": __parse_whisper,
+    "NOTICE": __parse_notice,
+    "RECONNECT": __parse_reconnect,
+}
+
+
 
 # Helper Methods
 
-def __get_single_int(line: str, key: str, default: int = 0, end=";") -> int:
-    target = __get_single(line, key)
-    if target is None:
+class TagSection():
+    """The tag section of a line, read one tag at a time.
+
+    Lazily parsed messages keep this instead of a dictionary of their tags: it only refers to 
+    the line the message already holds, and each tag is looked up in the line when an 
+    attribute is first decoded from it."""
+    __slots__ = ("line", "end")
+    ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+    ESCAPE_PATTERN = re.compile(r"\\(.?)", re.DOTALL)
+
+    def __init__(self, line: str, end: int):
+        self.line = line
+        self.end = end
+
+    def get(self, key: str, default: str = None) -> str:
+        line, end = self.line, self.end
+        needle = f"{key}="
+        position = line.find(needle, 1, end)
+        while position != -1 and line[position - 1] not in "@;":
+            position = line.find(needle, position + 1, end)
+        if position == -1:
+            return default
+        position += len(needle)
+        stop = line.find(";", position, end)
+        return TagSection.unescape(line[position:end if stop == -1 else stop])
+
+    @staticmethod
+    def unescape(value: str) -> str:
+        if "\\" not in value:
+            return value
+        return TagSection.ESCAPE_PATTERN.sub(lambda match: TagSection.ESCAPES.get(match.group(1), match.group(1)), value)
+
+def __split_line(line: str) -> tuple:
+    """Split a line into the end of its tag section (0 without tags), prefix, command and parameters.
+    
+    The trailing parameter (if any) is returned as the last entry in the parameter list."""
+    line = line.rstrip("\r\n")
+    tags_end = 0
+    prefix = None
+    position = 0
+    if line.startswith("@"):
+        position = line.find(" ")
+        if position == -1:
+            return tags_end, prefix, None, []
+        tags_end = position
+        position += 1
+    if line.startswith(":", position):
+        end = line.find(" ", position)
+        if end == -1:
+            return tags_end, line[position + 1:], None, []
+        prefix = line[position + 1:end]
+        position = end + 1
+    trailing = line.find(" :", position)
+    if trailing == -1:
+        params = line[position:].split()
+    else:
+        params = line[position:trailing].split()
+        params.append(line[trailing + 2:])
+    if not params:
+        return tags_end, prefix, None, params
+    return tags_end, prefix, params.pop(0), params
+
+def __get_tags(line: str, end: int, lazy: bool):
+    """The tags of a line, as a `TagSection` when `lazy` is set or as a dictionary otherwise."""
+    if lazy:
+        return TagSection(line, end)
+    if end == 0:
+        return {}
+    return __parse_tags(line[1:end])
+
+def __parse_tags(section: str) -> dict:
+    """Split the IRCv3 tag section of a line into a dictionary of unescaped values"""
+    tags = {}
+    for tag in section.split(";"):
+        key, _, value = tag.partition("=")
+        if "\\" in value:
+            value = TagSection.unescape(value)
+        tags[key] = value
+    return tags
+
+def __get_single_int(tags: dict, key: str, default: int = 0) -> int:
+    target = tags.get(key)
+    if not target:
         return default
     else:
         return int(target)
 
-def __get_single(line: str, key:str, end=";") -> str:
-    try:
-        return line.split(f"{key}=")[1].split(end)[0]
-    except IndexError:
-        return None
+def __get_single(tags: dict, key: str) -> str:
+    return tags.get(key)
 
-def __get_list(line: str, key:str, end=";") -> list:
-    try:
-        return line.split(f"{key}=")[1].split(end)[0].split(",")
-    except IndexError:
+def __get_list(tags: dict, key: str) -> list:
+    value = tags.get(key)
+    if value is None:
         return None
+    return value.split(",")
 
-def __get_channel(line: str, key: str) -> str:
-    try:
-        l = line.split(f"{key} #", 1)[1].replace("\\r", "").strip()
-        try:
-            return l.split(" ", 1)[0]
-        except IndexError:
-            return l
-    except IndexError:
-        return None
+def __get_badges(tags: dict) -> list:
+    return [badge.partition("/")[0] for badge in tags.get("badges", "").split(",")]
 
-def __get_message(line: str, key: str) -> str:
-    try:
-        return line.split(f" {key} #",1)[1].split(" ",1)[1][1:].strip()
-    except IndexError:
-        return None
+def __get_channel(params: list) -> str:
+    if params and params[0].startswith("#"):
+        return params[0][1:]
+    return None
 
-def __get_whisper_message(line: str) -> str:
-    try:
-        return line.split(" WHISPER ",1)[1].split(" ",1)[1][1:].strip()
-    except IndexError:
+def __get_trailing(params: list) -> str:
+    if len(params) < 2:
         return None
-    
-def __get_whisper_channel(line: str) -> str:
-    try:
-        l = line.split("WHISPER ", 1)[1]
-        try:
-            return l.split(" ", 1)[0]
-        except IndexError:
-            return l
-    except IndexError:
+    return params[-1].strip()
+
+def __get_command_prefix(text: str, command_activator) -> str:
+    if isinstance(command_activator, str):
+        return command_activator
+    for prefix in command_activator:
+        if text.startswith(prefix):
+            return prefix
+
+def __get_user(prefix: str) -> str:
+    if prefix is None or "!" not in prefix:
         return None
+    return prefix.split("!", 1)[0]
 
-def __get_time_from_timestamp(line: str) -> datetime:
-    tm = __get_single(line, "tmi-sent-ts")
+def __get_time_from_timestamp(tags: dict) -> datetime:
+    tm = __get_single(tags, "tmi-sent-ts")
     tm = tm[:-3]+ "." + tm[-3:]
     return datetime.utcfromtimestamp(float(tm))
+
+
+
+# Tag Decoders: map attribute names to the function that decodes them from the tags
+
+def __apply_decoders(msg: RawMessage, tags: dict, decoders: dict, lazy: bool):
+    if lazy:
+        msg._tags = tags
+        msg._decoders = decoders
+        return
+    for name, decode in decoders.items():
+        setattr(msg, name, decode(tags))
+
+def __get_mod(tags: dict) -> bool:
+    return "1" == tags.get("mod") or tags.get("room-id") == tags.get("user-id")
+
+def __get_sub(tags: dict) -> bool:
+    return "subscriber" in (tags.get("badge-info") or "")
+
+def __is_anonymous_gift(tags: dict) -> bool:
+    return tags.get("msg-id") in ("anonsubgift","submysterygift", "anongiftpaidupgrade")
+
+def __is_sender_in_params(tags: dict) -> bool:
+    return __get_single_int(tags, "msg-param-mass-gift-count") > 1 or tags.get("msg-id") in ("giftpaidupgrade","anongiftpaidupgrade")
+
+def __get_gift_sender_login(tags: dict) -> str:
+    if __is_anonymous_gift(tags):
+        return "unknown"
+    if __is_sender_in_params(tags):
+        return tags.get("msg-param-sender-login")
+    return tags.get("login")
+
+def __get_gift_sender_display_name(tags: dict) -> str:
+    if __is_anonymous_gift(tags):
+        return "Some Anonymous Legend"
+    if __is_sender_in_params(tags):
+        return tags.get("msg-param-sender-name")
+    return tags.get("display-name")
+
+def __get_gift_recipient_display_name(tags: dict) -> str:
+    name = tags.get("msg-param-recipient-display-name")
+    if name is None:
+        return tags.get("display-name")
+    return name
+
+
+__PRIVMSG_DECODERS = {
+    "badge_info": lambda tags: tags.get("badge-info"),
+    "badges": __get_badges,
+    "bits": lambda tags: tags.get("bits"),
+    "color": lambda tags: tags.get("color"),
+    "display_name": lambda tags: tags.get("display-name"),
+    "emotes": lambda tags: __get_list(tags, "emotes"),
+    "id": lambda tags: tags.get("id"),
+    "room_id": lambda tags: tags.get("room-id"),
+    "sent_timestamp": __get_time_from_timestamp,
+    "user_id": lambda tags: tags.get("user-id"),
+    "mod": __get_mod,
+    "sub": __get_sub,
+}
+
+__USERNOTICE_DECODERS = {
+    **__PRIVMSG_DECODERS,
+    "system_message": lambda tags: tags.get("system-msg"),
+    "login": lambda tags: tags.get("login"),
+}
+
+__SUBSCRIBER_DECODERS = {
+    **__USERNOTICE_DECODERS,
+    "cumulative_months": lambda tags: __get_single_int(tags, "msg-param-cumulative-months"),
+    "streak_months": lambda tags: __get_single_int(tags, "msg-param-streak-months"),
+    "share_streak": lambda tags: tags.get("msg-param-should-share-streak") == "1",
+    "sub_plan": lambda tags: tags.get("msg-param-sub-plan"),
+    "sub_plan_name": lambda tags: tags.get("msg-param-sub-plan-name"),
+}
+
+__GIFTED_SUBSCRIBER_DECODERS = {
+    **__USERNOTICE_DECODERS,
+    "anonymous": __is_anonymous_gift,
+    "sub_plan": lambda tags: tags.get("msg-param-sub-plan"),
+    "sub_plan_name": lambda tags: tags.get("msg-param-sub-plan-name"),
+    "cumulative_months": lambda tags: __get_single_int(tags, "msg-param-months"),
+    "promo_gift_total": lambda tags: __get_single_int(tags, "msg-param-promo-gift-total"),
+    "mass_gift_count": lambda tags: __get_single_int(tags, "msg-param-mass-gift-count"),
+    "sender_count": lambda tags: __get_single_int(tags, "msg-param-sender-count"),
+    "promo_name": lambda tags: tags.get("msg-param-promo-name"),
+    "recipient_display_name": __get_gift_recipient_display_name,
+    "recipient_login": lambda tags: tags.get("msg-param-recipient-user-name"),
+    "recipient_id": lambda tags: tags.get("msg-param-recipient-id"),
+    "sender_login": __get_gift_sender_login,
+    "sender_display_name": __get_gift_sender_display_name,
+}
+
+__RAID_DECODERS = {
+    **__USERNOTICE_DECODERS,
+    "raider_display_name": lambda tags: tags.get("msg-param-displayName"),
+    "raider_login": lambda tags: tags.get("msg-param-login"),
+    "viewer_count": lambda tags: __get_single_int(tags, "msg-param-viewerCount"),
+}
+
+__RITUAL_DECODERS = {
+    **__USERNOTICE_DECODERS,
+    "ritual_name": lambda tags: tags.get("msg-param-ritual-name"),
+}
+
+__BIT_BADGE_UPGRADE_DECODERS = {
+    **__USERNOTICE_DECODERS,
+    "threshold": lambda tags: tags.get("msg-param-threshold"),
+}
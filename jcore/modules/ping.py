@@ -1,4 +1,4 @@
-from jcore.extensions import Module
+from jcore.extensions import Module, command
 from jcore.message import PrivateMessage, CommandMessage
 import jcore
 
@@ -15,12 +15,15 @@ class Ping(Module):
             elif "peanut" == message.message_text:
                 await message.send("butter! Kappa")
 
-    async def on_command(self, message: CommandMessage):
+    @command("ping")
+    async def ping(self, message: CommandMessage):
         if message.user_id == "82504138":
-            if "ping" == message.KEYWORD:
-                await message.send("pong...")
-            elif "peanut" == message.KEYWORD:
-                await message.send("butter! Kappa")
+            await message.send("pong...")
+
+    @command("peanut")
+    async def peanut(self, message: CommandMessage):
+        if message.user_id == "82504138":
+            await message.send("butter! Kappa")
                 
 
 
@@ -0,0 +1,456 @@
+import asyncio
+from collections import OrderedDict, deque
+import logging
+import time
+
+
+log = logging.getLogger(__name__)
+
+
+# Twitch chat limits: https://dev.twitch.tv/docs/irc#rate-limits
+MESSAGE_LIMIT = 20
+MESSAGE_LIMIT_MODERATOR = 100
+MESSAGE_PERIOD = 30
+CHANNEL_MESSAGE_LIMIT = 1
+CHANNEL_MESSAGE_PERIOD = 1
+
+# Twitch authentication limits
+AUTH_LIMIT = 20
+AUTH_PERIOD = 10
+
+# Twitch join limits: https://dev.twitch.tv/docs/irc#rate-limits
+JOIN_LIMIT = 20
+JOIN_LIMIT_VERIFIED = 2000
+JOIN_PERIOD = 10
+# maximum length of an IRC line, excluding the trailing CR-LF.
+MAX_LINE_LENGTH = 510
+
+PRIVILEGED_BADGES = ("broadcaster", "moderator", "vip")
+
+# outbound lanes, in priority order.
+LANE_MODERATION = 0
+LANE_REPLY = 1
+LANE_ANNOUNCEMENT = 2
+LANES = (LANE_MODERATION, LANE_REPLY, LANE_ANNOUNCEMENT)
+
+# what happens to a message sent to a lane that has reached its max depth.
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_COALESCE = "coalesce"
+OVERFLOW_POLICIES = (OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE)
+
+# (max depth, overflow policy) per lane, a max depth of None leaves the lane unbounded.
+LANE_LIMITS = {
+    LANE_MODERATION: (None, OVERFLOW_DROP_NEWEST),
+    LANE_REPLY: (200, OVERFLOW_DROP_OLDEST),
+    LANE_ANNOUNCEMENT: (50, OVERFLOW_COALESCE),
+}
+# tokens of the moderator bucket that only the moderation lane can spend.
+MODERATION_RESERVE = 5
+
+
+class TokenBucket():
+    """A bucket of `capacity` tokens, where every token spent is returned to the bucket
+    `period` seconds after it was spent.
+
+    No more than `capacity` tokens can be spent in any window of `period` seconds,
+    which is how Twitch counts its limits, while still allowing a full burst whenever
+    the previous window has expired."""
+    capacity: int
+    period: float
+    __spent: deque
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.period = period
+        self.__spent = deque()
+
+    @property
+    def tokens(self) -> int:
+        """The number of tokens that can be spent right now."""
+        self.__release(time.monotonic())
+        return max(self.capacity - len(self.__spent), 0)
+
+    def delay(self, tokens: int = 1) -> float:
+        """The number of seconds until `tokens` tokens can be spent."""
+        now = time.monotonic()
+        self.__release(now)
+        over = len(self.__spent) + tokens - self.capacity
+        if over <= 0:
+            return 0
+        if over > len(self.__spent):
+            # more tokens were requested than the bucket can ever hold.
+            return self.period
+        return self.__spent[over - 1] + self.period - now
+
+    def consume(self, tokens: int = 1) -> bool:
+        """Spend `tokens` tokens if they are available, returns whether they were spent."""
+        if self.delay(tokens) > 0:
+            return False
+        now = time.monotonic()
+        self.__spent.extend([now] * tokens)
+        return True
+
+    async def acquire(self, tokens: int = 1):
+        """Wait until `tokens` tokens are available and spend them."""
+        while not self.consume(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+    def __release(self, now: float):
+        spent = self.__spent
+        while spent and spent[0] + self.period <= now:
+            spent.popleft()
+
+
+
+class Send():
+    """A line queued to be written by a socket."""
+    __slots__ = ("socket", "channel", "line", "future", "lane", "sequence")
+
+    def __init__(self, socket, channel: str, line: str, future: asyncio.Future, lane: int, sequence: int):
+        self.socket = socket
+        self.channel = channel
+        self.line = line
+        self.future = future
+        self.lane = lane
+        self.sequence = sequence
+
+
+
+class SendScheduler():
+    """Client-wide scheduler for outgoing chat messages.
+
+    Messages are queued per lane and per channel. The moderation lane is always served
+    before the reply lane, which is served before the announcement lane; within a lane
+    the channels are served in round-robin order. Messages are written as fast as the
+    Twitch rate limits allow:
+
+    - every message counts against the `moderator_limit` per `period` bucket, of which the
+      last `MODERATION_RESERVE` tokens are kept for the moderation lane,
+    - messages to channels where the bot is not a moderator, VIP or the broadcaster also count
+      against the `limit` per `period` bucket, and are limited to `channel_limit` messages
+      per `channel_period` in that channel.
+
+    Each lane can be bounded with `set_lane_limit`. When a bounded lane is full, the
+    overflow policy decides which message is dropped: the new one (`drop_newest`), the
+    oldest one in the lane (`drop_oldest`), or the messages already queued for the same
+    channel, so that only the latest one is kept (`coalesce`).
+    The futures of dropped messages, and of messages that could not be written because
+    the connection was lost, resolve to `False`.
+    """
+    __lanes: list
+    __moderated: set
+    __channel_buckets: dict
+
+    def __init__(self, limit: int = MESSAGE_LIMIT, moderator_limit: int = MESSAGE_LIMIT_MODERATOR, period: float = MESSAGE_PERIOD,
+            channel_limit: int = CHANNEL_MESSAGE_LIMIT, channel_period: float = CHANNEL_MESSAGE_PERIOD):
+        self.loop = asyncio.get_event_loop()
+        self.user_bucket = TokenBucket(limit, period)
+        self.moderator_bucket = TokenBucket(moderator_limit, period)
+        self.channel_limit = channel_limit
+        self.channel_period = channel_period
+        self.moderation_reserve = MODERATION_RESERVE
+        self.lane_limits = dict(LANE_LIMITS)
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.__lanes = [OrderedDict() for lane in LANES]
+        self.__depths = [0 for lane in LANES]
+        self.__sequence = 0
+        self.__moderated = set()
+        self.__channel_buckets = {}
+        self.__worker = None
+        self.__wakeup = asyncio.Event()
+
+    @property
+    def pending(self) -> int:
+        """The total number of messages waiting to be sent."""
+        return sum(self.__depths)
+
+    @property
+    def pending_by_lane(self) -> dict:
+        """The number of messages waiting to be sent, per lane."""
+        return {lane: self.__depths[lane] for lane in LANES}
+
+    @property
+    def pending_by_channel(self) -> dict:
+        """The number of messages waiting to be sent, per channel."""
+        pending = {}
+        for channels in self.__lanes:
+            for channel, queue in channels.items():
+                pending[channel] = pending.get(channel, 0) + len(queue)
+        return pending
+
+    def set_lane_limit(self, lane: int, max_depth: int = None, overflow: str = OVERFLOW_DROP_OLDEST):
+        """Bound the number of messages queued in a lane, `None` leaves the lane unbounded."""
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane `{lane}`")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy `{overflow}`, expected one of: {', '.join(OVERFLOW_POLICIES)}")
+        self.lane_limits[lane] = (max_depth, overflow)
+
+    def is_moderator(self, channel: str) -> bool:
+        return channel in self.__moderated
+
+    def set_moderator(self, channel: str, moderator: bool):
+        """Record whether the bot has elevated rate limits (moderator, VIP or broadcaster) in a channel."""
+        if moderator:
+            self.__moderated.add(channel)
+        else:
+            self.__moderated.discard(channel)
+
+    def update_from_userstate(self, message):
+        """Update the moderator status of a channel from a `UserState` message."""
+        badges = message.badges or ()
+        self.set_moderator(message.channel, message.mod or any(badge in badges for badge in PRIVILEGED_BADGES))
+
+    def send(self, socket, channel: str, line: str, lane: int = LANE_REPLY) -> asyncio.Future:
+        """Queue `line` to be written by `socket`. Returns a future that resolves to `True`
+        once the line has been written, or to `False` if it was dropped from a full lane or
+        could not be written."""
+        future = self.loop.create_future()
+        self.__sequence += 1
+        send = Send(socket, channel, line, future, lane, self.__sequence)
+        max_depth, overflow = self.lane_limits[lane]
+        if max_depth is not None and self.__depths[lane] >= max_depth:
+            if overflow == OVERFLOW_DROP_NEWEST:
+                self.__drop(send)
+                return future
+            if overflow == OVERFLOW_COALESCE and channel in self.__lanes[lane]:
+                self.__drop_channel(lane, channel)
+            else:
+                self.__drop_oldest(lane)
+
+        channels = self.__lanes[lane]
+        queue = channels.get(channel)
+        if queue is None:
+            queue = channels[channel] = deque()
+        queue.append(send)
+        self.__depths[lane] += 1
+        self.__wakeup.set()
+        if self.__worker is None or self.__worker.done():
+            self.__worker = self.loop.create_task(self.__run())
+        return future
+
+    def delay(self, channel: str, lane: int = LANE_REPLY) -> float:
+        """The number of seconds until a message in `lane` can be sent to `channel`."""
+        reserve = 0 if lane == LANE_MODERATION else self.moderation_reserve
+        delay = self.moderator_bucket.delay(1 + reserve)
+        if channel not in self.__moderated:
+            delay = max(delay, self.user_bucket.delay(), self.__get_channel_bucket(channel).delay())
+        return delay
+
+    def __consume(self, channel: str):
+        self.moderator_bucket.consume()
+        if channel not in self.__moderated:
+            self.user_bucket.consume()
+            self.__get_channel_bucket(channel).consume()
+
+    def __get_channel_bucket(self, channel: str) -> TokenBucket:
+        bucket = self.__channel_buckets.get(channel)
+        if bucket is None:
+            bucket = self.__channel_buckets[channel] = TokenBucket(self.channel_limit, self.channel_period)
+        return bucket
+
+    def __drop(self, send: Send):
+        self.dropped += 1
+        if not send.future.done():
+            send.future.set_result(False)
+
+    def __drop_channel(self, lane: int, channel: str):
+        queue = self.__lanes[lane].pop(channel)
+        self.__depths[lane] -= len(queue)
+        for send in queue:
+            self.__drop(send)
+
+    def __drop_oldest(self, lane: int):
+        channels = self.__lanes[lane]
+        if not channels:
+            return
+        channel = min(channels, key=lambda name: channels[name][0].sequence)
+        queue = channels[channel]
+        self.__drop(queue.popleft())
+        self.__depths[lane] -= 1
+        if not queue:
+            del channels[channel]
+
+    def __next_send(self):
+        """Pop the next message that can be sent right now, returns the message
+        (or None) and how long to wait before trying again."""
+        wait = None
+        for lane in LANES:
+            channels = self.__lanes[lane]
+            for channel in list(channels):
+                queue = channels[channel]
+                while queue and queue[0].future.done():
+                    # cancelled by the caller before it was sent.
+                    queue.popleft()
+                    self.__depths[lane] -= 1
+                if not queue:
+                    del channels[channel]
+                    continue
+                delay = self.delay(channel, lane)
+                if delay > 0:
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+                send = queue.popleft()
+                self.__depths[lane] -= 1
+                if queue:
+                    channels.move_to_end(channel)
+                else:
+                    del channels[channel]
+                return send, 0
+        return None, wait
+
+    async def __run(self):
+        while self.pending:
+            send, wait = self.__next_send()
+            if send is None:
+                if wait is None:
+                    continue
+                self.__wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.__wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.__consume(send.channel)
+            try:
+                await send.socket._send_raw(send.line)
+            except Exception:
+                # logged by the socket, which reconnects without holding up the other sockets.
+                self.failed += 1
+                if not send.future.done():
+                    send.future.set_result(False)
+                continue
+            self.sent += 1
+            if not send.future.done():
+                send.future.set_result(True)
+
+
+
+class JoinScheduler():
+    """Client-wide scheduler for JOIN requests.
+
+    Channels queued by any socket of the client share one join budget (`limit` joins per
+    `period`, Twitch counts every channel of a multi-channel JOIN). Whenever budget is
+    available, the queued channels are batched into as few `JOIN #a,#b,#c` lines per
+    socket as the IRC line length allows."""
+    __queue: deque
+    __queued: dict
+
+    def __init__(self, limit: int = JOIN_LIMIT, period: float = JOIN_PERIOD):
+        self.loop = asyncio.get_event_loop()
+        self.bucket = TokenBucket(limit, period)
+        self.requested = 0
+        self.joined = 0
+        self.failed = 0
+        self.__queue = deque()
+        self.__queued = {}
+        self.__worker = None
+
+    @property
+    def pending(self) -> int:
+        """The number of channels waiting to be joined."""
+        return len(self.__queue)
+
+    @property
+    def progress(self) -> float:
+        """The fraction of the requested channels that have been joined, between 0 and 1."""
+        if self.requested == 0:
+            return 1.0
+        return self.joined / self.requested
+
+    @property
+    def eta(self) -> float:
+        """Estimated number of seconds until every queued channel has been joined."""
+        pending = len(self.__queue)
+        if pending == 0:
+            return 0
+        capacity = self.bucket.capacity
+        full_windows = (pending - 1) // capacity
+        return self.bucket.delay(min(pending, capacity)) + full_windows * self.bucket.period
+
+    def request(self, socket, channel: str, transport = None) -> asyncio.Future:
+        """Queue `channel` to be joined by `socket`. Returns a future that resolves to `True` once
+        the JOIN request for the channel has been written, or to `False` if it could not be
+        written because the connection was lost. The request is written to the 
+        socket's current connection, unless another one of its connections is given as `transport`."""
+        future = self.__queued.get((socket, channel, transport))
+        if future is not None:
+            return future
+        future = self.loop.create_future()
+        self.__queue.append((socket, channel, future, transport))
+        self.__queued[(socket, channel, transport)] = future
+        self.requested += 1
+        if self.__worker is None or self.__worker.done():
+            self.__worker = self.loop.create_task(self.__run())
+        return future
+
+    def discard(self, socket, channel: str):
+        """Drop the queued JOIN requests of a socket for a channel, e.g. when the channel is departed
+        before it was joined. Their futures resolve to `False`."""
+        remaining = deque()
+        for entry in self.__queue:
+            if entry[0] is socket and entry[1] == channel:
+                self.__queued.pop((socket, channel, entry[3]), None)
+                self.requested -= 1
+                if not entry[2].done():
+                    entry[2].set_result(False)
+            else:
+                remaining.append(entry)
+        self.__queue = remaining
+
+    def cancel(self, socket):
+        """Drop the queued channels of a socket, e.g. when it is disconnected."""
+        remaining = deque()
+        for entry in self.__queue:
+            if entry[0] is socket:
+                self.__queued.pop((socket, entry[1], entry[3]), None)
+                self.requested -= 1
+                entry[2].cancel()
+            else:
+                remaining.append(entry)
+        self.__queue = remaining
+
+    async def __run(self):
+        while self.__queue:
+            tokens = self.bucket.tokens
+            if tokens == 0:
+                await asyncio.sleep(self.bucket.delay())
+                continue
+            batches = {}
+            for _ in range(min(tokens, len(self.__queue))):
+                socket, channel, future, transport = self.__queue.popleft()
+                self.__queued.pop((socket, channel, transport), None)
+                batches.setdefault((socket, transport), []).append((channel, future))
+            self.bucket.consume(sum(len(batch) for batch in batches.values()))
+            for (socket, transport), batch in batches.items():
+                for line, futures in self.__get_join_lines(batch):
+                    try:
+                        await socket._send_raw(line, transport)
+                    except Exception:
+                        # logged by the socket, which joins its channels again once it has reconnected.
+                        written = False
+                        self.failed += len(futures)
+                    else:
+                        written = True
+                        self.joined += len(futures)
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(written)
+
+    @staticmethod
+    def __get_join_lines(batch: list):
+        line = "JOIN "
+        futures = []
+        for channel, future in batch:
+            name = f"#{channel}"
+            if futures and len(line) + 1 + len(name) > MAX_LINE_LENGTH:
+                yield line, futures
+                line = "JOIN "
+                futures = []
+            line += f",{name}" if futures else name
+            futures.append(future)
+        if futures:
+            yield line, futures
@@ -0,0 +1,129 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import logging
+import random
+import traceback
+
+
+log = logging.getLogger(__name__)
+
+
+class Timer():
+    """A callback scheduled with `Scheduler.call_later` or `Scheduler.call_every`.
+
+    `runs` counts the calls made, and `overruns` the calls skipped because the previous 
+    run was still going, or because the event loop was too busy to make the deadline."""
+    __slots__ = ("callback", "args", "interval", "jitter", "due", "deadline", "cancelled", "task", "runs", "overruns")
+
+    def __init__(self, callback, args: tuple, interval: float, due: float, jitter: float = 0):
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.jitter = jitter
+        self.due = due
+        self.deadline = due + random.uniform(0, jitter) if jitter else due
+        self.cancelled = False
+        self.task = None
+        self.runs = 0
+        self.overruns = 0
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def __repr__(self):
+        return f"[Timer]: {getattr(self.callback, '__qualname__', self.callback)} (interval: {self.interval}, deadline: {self.deadline:.3f}, runs: {self.runs}, overruns: {self.overruns})"
+
+
+class Scheduler():
+    """Runs callbacks at their deadlines from a single heap.
+
+    Only the earliest deadline is armed on the event loop, so any number of timers cost one
+    wakeup per deadline and nothing at all while none are due. Callbacks may be plain functions
+    or coroutine functions, coroutines are run as tasks. Exceptions raised by a callback are
+    logged and do not affect the other timers."""
+    __heap: list
+    __handle: asyncio.TimerHandle
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.__heap = []
+        self.__sequence = itertools.count()
+        self.__handle = None
+
+    @property
+    def pending(self) -> int:
+        """The number of timers waiting for their deadline, including cancelled ones not yet discarded."""
+        return len(self.__heap)
+
+    def call_later(self, delay: float, callback, *args) -> Timer:
+        """Call `callback(*args)` once, `delay` seconds from now."""
+        return self.__push(Timer(callback, args, None, self.loop.time() + delay))
+
+    def call_every(self, interval: float, callback, *args, delay: float = None, jitter: float = 0) -> Timer:
+        """Call `callback(*args)` every `interval` seconds, the first time after `delay`
+        seconds (defaults to `interval`). Each call is delayed by a random amount of up to 
+        `jitter` seconds, without drifting from the interval. A call is skipped while the 
+        coroutine started by the previous call is still running."""
+        if interval <= 0:
+            raise ValueError("interval must be greater than 0")
+        return self.__push(Timer(callback, args, interval, self.loop.time() + (interval if delay is None else delay), jitter))
+
+    def __push(self, timer: Timer) -> Timer:
+        heapq.heappush(self.__heap, (timer.deadline, next(self.__sequence), timer))
+        if self.__heap[0][2] is timer:
+            self.__arm()
+        return timer
+
+    def __arm(self):
+        if self.__handle is not None:
+            self.__handle.cancel()
+            self.__handle = None
+        if self.__heap:
+            self.__handle = self.loop.call_at(self.__heap[0][0], self.__run)
+
+    def __run(self):
+        self.__handle = None
+        now = self.loop.time()
+        expired = []
+        while self.__heap and self.__heap[0][0] <= now:
+            expired.append(heapq.heappop(self.__heap)[2])
+        for timer in expired:
+            if timer.cancelled:
+                continue
+            if timer.interval is not None:
+                # deadlines missed while the loop was busy are skipped, not run back to back.
+                missed = int((now - timer.deadline) // timer.interval)
+                timer.overruns += missed
+                timer.due += (missed + 1) * timer.interval
+                timer.deadline = timer.due + random.uniform(0, timer.jitter) if timer.jitter else timer.due
+                heapq.heappush(self.__heap, (timer.deadline, next(self.__sequence), timer))
+                if timer.running:
+                    timer.overruns += 1
+                    continue
+            self.__call(timer)
+        self.__arm()
+
+    def __call(self, timer: Timer):
+        timer.runs += 1
+        try:
+            result = timer.callback(*timer.args)
+            if inspect.isawaitable(result):
+                timer.task = self.loop.create_task(self.__await(timer, result))
+        except Exception as e:
+            self.__log_exception(timer, e)
+
+    async def __await(self, timer: Timer, awaitable):
+        try:
+            await awaitable
+        except Exception as e:
+            self.__log_exception(timer, e)
+
+    @staticmethod
+    def __log_exception(timer: Timer, e: Exception):
+        log.exception(f"Suppressing a caught an exception in timer `{getattr(timer.callback, '__qualname__', timer.callback)}`, will continue without raising. Details below\n{type(e)}: {traceback.format_exc()}")
@@ -0,0 +1,69 @@
+import time
+
+
+WINDOW_SECONDS = 60
+
+
+class RateWindow():
+    """Counts events in a ring of per-second buckets covering the last `size` seconds.
+
+    Recording an event is an index and an increment; buckets of the seconds that passed
+    since the last event are cleared lazily when the ring is next touched."""
+    __slots__ = ("size", "started", "__counts", "__second")
+
+    def __init__(self, size: int = WINDOW_SECONDS):
+        self.size = size
+        self.started = time.monotonic()
+        self.__counts = [0] * size
+        self.__second = int(self.started)
+
+    def hit(self, count: int = 1):
+        """Record `count` events in the current second."""
+        second = int(time.monotonic())
+        if second != self.__second:
+            self.__advance(second)
+        self.__counts[second % self.size] += count
+
+    @property
+    def age(self) -> float:
+        """Seconds since the window was created, the rate is only representative once this exceeds `size`."""
+        return time.monotonic() - self.started
+
+    @property
+    def count(self) -> int:
+        """The number of events in the window."""
+        self.__advance(int(time.monotonic()))
+        return sum(self.__counts)
+
+    @property
+    def rate(self) -> float:
+        """The average number of events per second over the window."""
+        return self.count / self.size
+
+    @property
+    def peak(self) -> int:
+        """The highest number of events in a single second of the window."""
+        self.__advance(int(time.monotonic()))
+        return max(self.__counts)
+
+    @property
+    def burstiness(self) -> float:
+        """The peak rate divided by the average rate, 1 for perfectly even traffic and 0 without traffic."""
+        rate = self.rate
+        if rate == 0:
+            return 0
+        return self.peak / rate
+
+    def __advance(self, second: int):
+        elapsed = second - self.__second
+        if elapsed <= 0:
+            return
+        if elapsed >= self.size:
+            self.__counts = [0] * self.size
+        else:
+            for past in range(self.__second + 1, second + 1):
+                self.__counts[past % self.size] = 0
+        self.__second = second
+
+    def __repr__(self):
+        return f"[RateWindow]: {self.rate:.2f}/s (peak {self.peak}/s over {self.size}s)"
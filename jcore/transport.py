@@ -0,0 +1,249 @@
+import asyncio
+import logging
+
+
+HOST = "irc.chat.twitch.tv"
+PORT = 6667
+READ_CHUNK_SIZE = 65536
+LINE_SEPARATOR = b"\r\n"
+YIELD_EVERY_LINES = 100
+YIELD_EVERY_US = 2000
+
+
+class LineBuffer():
+    """Accumulates raw bytes read from the connection and splits out complete IRC lines."""
+    __data: bytearray
+
+    def __init__(self):
+        self.__data = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """Append a chunk of data to the buffer and return the complete lines (as bytes,
+        without the line separator) that are now available. Any partial line is kept
+        in the buffer until the rest of it arrives."""
+        self.__data += data
+        end = self.__data.rfind(LINE_SEPARATOR)
+        if end == -1:
+            return []
+        lines = self.__data[:end].split(LINE_SEPARATOR)
+        del self.__data[:end + len(LINE_SEPARATOR)]
+        return lines
+
+    def clear(self):
+        self.__data.clear()
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+
+
+class Transport():
+    """Base class for the connection used by a `Socket`.
+
+    A transport owns the network connection, splits the incoming data into lines and
+    hands each decoded line to `socket._handle_line`, together with the transport it came 
+    from. Outgoing data is written with `write` and flushed with `drain`."""
+    log: logging.Logger
+
+    def __init__(self, socket):
+        self.socket = socket
+        self.log = socket.log
+        self.buffer = LineBuffer()
+
+    async def connect(self, host: str = None, port: int = None):
+        raise NotImplementedError()
+
+    async def run(self):
+        """Process incoming data until the connection is closed."""
+        raise NotImplementedError()
+
+    def write(self, data: bytes):
+        raise NotImplementedError()
+
+    async def drain(self):
+        raise NotImplementedError()
+
+    def close(self):
+        raise NotImplementedError()
+
+    def is_closing(self) -> bool:
+        raise NotImplementedError()
+
+    def pause_reading(self):
+        """Stop processing incoming data until `resume_reading` is called, once the data 
+        already read has been processed. The server is slowed down through TCP flow control."""
+        raise NotImplementedError()
+
+    def resume_reading(self):
+        raise NotImplementedError()
+
+    def _feed(self, data: bytes) -> list:
+        """Split a chunk of data into decoded lines.
+        Lines that cannot be decoded are logged and dropped."""
+        lines = []
+        for raw_line in self.buffer.feed(data):
+            try:
+                lines.append(raw_line.decode())
+            except UnicodeDecodeError as e:
+                self.log.warning(f"Unicode Decode error detected, dropping line: {bytes(raw_line)!r}\nDetails: {e}")
+        return lines
+
+
+
+class StreamTransport(Transport):
+    """Transport built on the asyncio streams API (`asyncio.open_connection`).
+    Lines are read in chunks and the event loop is yielded to periodically while
+    processing a burst of lines."""
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+
+    def __init__(self, socket):
+        super().__init__(socket)
+        self.reader = None
+        self.writer = None
+        self.yield_every_lines = socket.yield_every_lines
+        self.yield_every_us = socket.yield_every_us
+        self.__lines_since_yield = 0
+        self.__last_yield = 0
+        self.__reading = asyncio.Event()
+        self.__reading.set()
+
+    async def connect(self, host: str = None, port: int = None):
+        self.reader, self.writer = await asyncio.open_connection(host=host or HOST, port=port or PORT)
+        self.__last_yield = asyncio.get_event_loop().time()
+
+    async def run(self):
+        while not self.writer.is_closing():
+            if not self.__reading.is_set():
+                await self.__reading.wait()
+            data = await self.reader.read(READ_CHUNK_SIZE)
+            if not data:
+                self.writer.close()
+                return
+            for line in self._feed(data):
+                self.socket._handle_line(line, self)
+                await self.__cooperative_yield()
+
+    def write(self, data: bytes):
+        self.writer.write(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def is_closing(self) -> bool:
+        return self.writer is None or self.writer.is_closing()
+
+    def pause_reading(self):
+        # the stream reader stops reading from the socket once its own buffer is full.
+        self.__reading.clear()
+
+    def resume_reading(self):
+        self.__reading.set()
+
+    async def __cooperative_yield(self):
+        """Hand control back to the event loop once every `yield_every_lines` lines,
+        or once `yield_every_us` microseconds have passed since the last yield."""
+        self.__lines_since_yield += 1
+        now = asyncio.get_event_loop().time()
+        if self.__lines_since_yield >= self.yield_every_lines or (now - self.__last_yield) * 1000000 >= self.yield_every_us:
+            await asyncio.sleep(0)
+            self.__lines_since_yield = 0
+            self.__last_yield = asyncio.get_event_loop().time()
+
+
+
+class ProtocolTransport(Transport, asyncio.Protocol):
+    """Transport built directly on `asyncio.Protocol`.
+    Lines are split and handed to the socket synchronously from `data_received`,
+    without going through the stream reader coroutines."""
+    transport: asyncio.Transport
+
+    def __init__(self, socket):
+        super().__init__(socket)
+        self.transport = None
+        self.__closed = None
+        self.__paused = False
+        self.__drain_waiters = []
+
+    async def connect(self, host: str = None, port: int = None):
+        loop = asyncio.get_event_loop()
+        self.__closed = loop.create_future()
+        await loop.create_connection(lambda: self, host=host or HOST, port=port or PORT)
+
+    async def run(self):
+        await asyncio.shield(self.__closed)
+
+    def write(self, data: bytes):
+        self.transport.write(data)
+
+    async def drain(self):
+        if self.transport is None or self.transport.is_closing():
+            raise ConnectionResetError("Connection lost")
+        if not self.__paused:
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        self.__drain_waiters.append(waiter)
+        await waiter
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def is_closing(self) -> bool:
+        return self.transport is None or self.transport.is_closing()
+
+    def pause_reading(self):
+        if not self.is_closing():
+            self.transport.pause_reading()
+
+    def resume_reading(self):
+        if not self.is_closing():
+            self.transport.resume_reading()
+
+    # asyncio.Protocol callbacks
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        for line in self._feed(data):
+            self.socket._handle_line(line, self)
+
+    def eof_received(self):
+        # returning a falsy value lets the transport close itself.
+        return False
+
+    def connection_lost(self, exc):
+        if exc is not None:
+            self.log.warning(f"Connection lost: {type(exc)}: {exc}")
+        if not self.__closed.done():
+            self.__closed.set_result(None)
+        self.__wake_drain_waiters(exc or ConnectionResetError("Connection lost"))
+
+    def pause_writing(self):
+        self.__paused = True
+
+    def resume_writing(self):
+        self.__paused = False
+        self.__wake_drain_waiters()
+
+    def __wake_drain_waiters(self, exc: Exception = None):
+        waiters, self.__drain_waiters = self.__drain_waiters, []
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            if exc is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(exc)
+
+
+
+TRANSPORTS = {
+    "stream": StreamTransport,
+    "protocol": ProtocolTransport,
+}
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+
+NICK = "testbot"
+
+
+class FakeTransport():
+    """Records the lines a socket writes instead of sending them to a server, the lines
+    the server would send are delivered with `receive`."""
+
+    def __init__(self, socket=None, refused: bool = False):
+        self.socket = socket
+        self.refused = refused
+        self.lines = []
+        self.closed = False
+        self.__closed = asyncio.Event()
+
+    async def connect(self, host: str = None, port: int = None):
+        if self.refused:
+            raise ConnectionRefusedError("connection refused")
+
+    def receive(self, *lines: str):
+        for line in lines:
+            self.socket._handle_line(line, self)
+
+    async def run(self):
+        await self.__closed.wait()
+
+    def write(self, data: bytes):
+        if self.closed:
+            raise BrokenPipeError("the connection has been closed")
+        self.lines.append(data.decode("utf-8").rstrip("\r\n"))
+
+    async def drain(self):
+        pass
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def close(self):
+        self.closed = True
+        self.__closed.set()
+
+    def pause_reading(self):
+        pass
+
+    def resume_reading(self):
+        pass
+
+
+class FakeConnections():
+    """A transport for `Client(transport=...)` that opens a `FakeTransport` for every connection,
+    after refusing the first `refuse` attempts. The connections opened are kept in `opened`."""
+
+    def __init__(self, refuse: int = 0):
+        self.refuse = refuse
+        self.attempts = 0
+        self.opened = []
+
+    def __call__(self, socket) -> FakeTransport:
+        self.attempts += 1
+        transport = FakeTransport(socket, refused=self.attempts <= self.refuse)
+        if not transport.refused:
+            self.opened.append(transport)
+        return transport
+
+
+class FakeClock():
+    """Stands in for `time.monotonic`, time only moves when the test advances it."""
+
+    def __init__(self, now: float = 1000):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def privmsg(channel: str, text: str, user: str = "viewer", message_id: str = None) -> str:
+    tags = f"badge-info=;badges=;color=;display-name={user};emotes=;mod=0;room-id=1;subscriber=0;tmi-sent-ts=1507246572675;turbo=0;user-id=1;user-type="
+    if message_id is not None:
+        tags = f"id={message_id};{tags}"
+    return f"@{tags} :{user}!{user}@{user}.tmi.twitch.tv PRIVMSG #{channel} :{text}"
+
+
+def roomstate(channel: str) -> str:
+    return f"@emote-only=0;followers-only=-1;r9k=0;room-id=1;slow=0;subs-only=0 :tmi.twitch.tv ROOMSTATE #{channel}"
+
+
+def whisper(user: str, text: str, message_id: str, thread_id: str) -> str:
+    return (f"@badges=;color=;display-name={user};emotes=;message-id={message_id};thread-id={thread_id};turbo=0;user-id=1;user-type= "
+        f":{user}!{user}@{user}.tmi.twitch.tv WHISPER {NICK} :{text}")
+
+
+class ClientTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs each test in a directory holding a config file for `NICK`, so clients can be created
+    without connecting them. Lines are fed to a socket with `feed`."""
+
+    channels = ()
+
+    def setUp(self):
+        self.__cwd = os.getcwd()
+        self.__directory = tempfile.TemporaryDirectory()
+        os.chdir(self.__directory.name)
+        with open("config.json", "w") as config:
+            json.dump({"nick": NICK, "token": "oauth:test", "channels": list(self.channels)}, config)
+
+    def tearDown(self):
+        os.chdir(self.__cwd)
+        self.__directory.cleanup()
+
+    def connect(self, client):
+        """Give every socket of the client a fake connection."""
+        for socket in client.sockets:
+            socket.transport = FakeTransport()
+
+    def feed(self, socket, *lines: str):
+        for line in lines:
+            socket._handle_line(line)
+
+    async def settle(self, client, timeout: float = 1):
+        """Wait until the client has no work left to dispatch."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        await asyncio.sleep(0)
+        while client.dispatcher.active_workers or client.dispatcher.pending:
+            if asyncio.get_running_loop().time() > deadline:
+                self.fail("the dispatcher did not settle in time")
+            await asyncio.sleep(0.01)
@@ -0,0 +1,73 @@
+import unittest
+from unittest import mock
+
+from jcore.balancer import NewSocket, Rebalancer
+
+from support import FakeClock
+
+
+def moves(migrations: list) -> list:
+    return [(migration.channel, migration.source, migration.target) for migration in migrations]
+
+
+class RebalancerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("jcore.balancer.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # sockets shed channels above 12 messages/s, take them below 8 and are emptied below 2.
+        self.balancer = Rebalancer(load_ratio=10, max_connections=100)
+
+    def test_balanced_sockets_are_left_alone(self):
+        self.assertEqual(self.balancer.plan({"a": {"x": 6, "y": 5}, "b": {"z": 3}}), ([], []))
+
+    def test_overloaded_socket_sheds_onto_the_fullest_fit(self):
+        migrations, retired = self.balancer.plan({"a": {"x": 5, "y": 4, "z": 4}, "b": {"p": 1}, "c": {"q": 3}})
+        self.assertEqual(moves(migrations), [("x", "a", "c")])
+        self.assertEqual(migrations[0].rate, 5)
+        # nothing else has room for the channel of the idle socket.
+        self.assertEqual(retired, [])
+
+    def test_channel_that_fits_nowhere_gets_a_new_socket(self):
+        migrations, retired = self.balancer.plan({"a": {"x": 6, "y": 5, "z": 4}, "b": {"p": 3}})
+        self.assertEqual(len(migrations), 1)
+        self.assertEqual((migrations[0].channel, migrations[0].source), ("x", "a"))
+        self.assertIsInstance(migrations[0].target, NewSocket)
+
+    def test_full_socket_is_not_a_target(self):
+        balancer = Rebalancer(load_ratio=10, max_connections=2)
+        migrations, _ = balancer.plan({"a": {"x": 5, "y": 4, "z": 4}, "b": {"p": 1}})
+        self.assertIsInstance(migrations[0].target, NewSocket)
+
+    def test_underloaded_socket_is_emptied(self):
+        migrations, retired = self.balancer.plan({"a": {"p": 0.6, "q": 0.3}, "b": {"r": 4}})
+        self.assertEqual(moves(migrations), [("p", "a", "b"), ("q", "a", "b")])
+        self.assertEqual(retired, ["a"])
+
+    def test_underloaded_socket_is_kept_when_its_channels_do_not_fit(self):
+        migrations, retired = self.balancer.plan({"a": {"p": 0.6, "q": 0.3}, "b": {"r": 7.5}})
+        self.assertEqual((migrations, retired), ([], []))
+
+    def test_pinned_channels_stay(self):
+        migrations, _ = self.balancer.plan({"a": {"x": 6, "y": 5, "z": 4}, "b": {"p": 2}}, pinned={"x"})
+        self.assertEqual(moves(migrations), [("y", "a", "b")])
+        migrations, retired = self.balancer.plan({"a": {"p": 0.6, "q": 0.3}, "b": {"r": 4}}, pinned={"q"})
+        self.assertEqual((migrations, retired), ([], []))
+
+    def test_migrated_channels_cool_down(self):
+        loads = {"a": {"x": 6, "y": 5, "z": 4}, "b": {"p": 2}}
+        self.balancer.migrated("x")
+        self.assertEqual(moves(self.balancer.plan(loads)[0]), [("y", "a", "b")])
+        self.clock.advance(self.balancer.cooldown)
+        self.assertFalse(self.balancer.is_cooling_down("x"))
+        self.assertEqual(moves(self.balancer.plan(loads)[0]), [("x", "a", "b")])
+
+    def test_migrations_are_capped(self):
+        loads = {"a": {f"x{i:02d}": 1 for i in range(30)}}
+        migrations, _ = self.balancer.plan(loads)
+        self.assertEqual(len(migrations), self.balancer.max_migrations)
+        # an idle socket is only emptied if all of its channels can be moved within the cap.
+        balancer = Rebalancer(load_ratio=10, max_connections=100, max_migrations=1)
+        self.assertEqual(balancer.plan({"a": {"p": 0.6, "q": 0.3}, "b": {"r": 4}}), ([], []))
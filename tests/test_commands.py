@@ -0,0 +1,39 @@
+import jcore
+from jcore.extensions import command
+
+from support import ClientTestCase, privmsg
+
+
+class CommandBot(jcore.Client):
+
+    def __init__(self, *args, **kwargs):
+        self.received = []
+        jcore.Client.__init__(self, *args, **kwargs)
+
+    async def on_privmessage(self, message):
+        self.received.append(("priv", message.message_text))
+
+    async def on_command(self, message):
+        self.received.append(("cmd", message.message_text))
+
+    @command("so", prefix="?")
+    async def shoutout(self, message):
+        self.received.append(("so", message.message_text))
+
+
+class CommandRoutingTest(ClientTestCase):
+    channels = ("chana",)
+
+    async def test_registered_prefix_command(self):
+        client = CommandBot()
+        self.connect(client)
+        self.feed(client.get_socket("chana"), privmsg("chana", "?so bob"), privmsg("chana", "!hi"))
+        await self.settle(client)
+        self.assertEqual(client.received, [("so", "?so bob"), ("cmd", "!hi")])
+
+    async def test_unmatched_prefix_is_chat(self):
+        client = CommandBot()
+        self.connect(client)
+        self.feed(client.get_socket("chana"), privmsg("chana", "?huh"), privmsg("chana", "? what is this"), privmsg("chana", "normal"))
+        await self.settle(client)
+        self.assertEqual(client.received, [("priv", "?huh"), ("priv", "? what is this"), ("priv", "normal")])
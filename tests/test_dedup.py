@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+
+import jcore
+from jcore.dedup import DedupCache
+
+from support import ClientTestCase, FakeClock, NICK, privmsg, whisper
+
+
+class WhisperBot(jcore.Client):
+
+    def __init__(self, *args, **kwargs):
+        self.whispers = []
+        self.chat = []
+        jcore.Client.__init__(self, *args, **kwargs)
+
+    async def on_whisper(self, message):
+        self.whispers.append((message.display_name, message.message_text))
+
+    async def on_privmessage(self, message):
+        self.chat.append(message.message_text)
+
+
+class DedupTest(ClientTestCase):
+    channels = ("chana", "chanb")
+
+    async def test_whispers_from_different_threads_share_message_ids(self):
+        client = WhisperBot(max_connections=2)
+        self.connect(client)
+        first, second = client.sockets
+        alice = whisper("alice", "hi from alice", "1", f"11_{NICK}")
+        bob = whisper("bob", "hi from bob", "1", f"12_{NICK}")
+        # every connection receives the whispers, each is only handled once.
+        self.feed(first, alice, bob)
+        self.feed(second, alice, bob)
+        await self.settle(client)
+        self.assertEqual(client.whispers, [("alice", "hi from alice"), ("bob", "hi from bob")])
+        self.assertEqual(client.dedup.hits, 2)
+
+    async def test_chat_messages_are_handled_once(self):
+        client = WhisperBot(max_connections=2)
+        self.connect(client)
+        first, second = client.sockets
+        line = privmsg("chana", "hello", message_id="b34ccfc7-4977-403a-8a94-33c6ac34fb93")
+        self.feed(first, line)
+        self.feed(second, line)
+        await self.settle(client)
+        self.assertEqual(client.chat, ["hello"])
+
+
+class DedupCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("jcore.dedup.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_duplicate_is_caught_after_a_rotation(self):
+        cache = DedupCache(window=30)
+        self.assertFalse(cache.seen("a"))
+        self.clock.advance(30)
+        # the next new id rotates the generations, "a" is now in the previous one.
+        self.assertFalse(cache.seen("b"))
+        self.assertTrue(cache.seen("a"))
+        self.assertTrue(cache.seen("b"))
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (2, 2, 2))
+
+    def test_ids_expire_after_two_windows(self):
+        cache = DedupCache(window=30)
+        cache.seen("a")
+        self.clock.advance(30)
+        cache.seen("b")
+        self.clock.advance(29)
+        cache.seen("c")
+        self.assertIn("a", cache)
+        self.clock.advance(1)
+        cache.seen("d")
+        self.assertNotIn("a", cache)
+        self.assertFalse(cache.seen("a"))
+        # ids are remembered for at least one window.
+        self.assertIn("c", cache)
+
+    def test_capacity_rotates(self):
+        cache = DedupCache(window=30, capacity=2)
+        for key in "abc":
+            self.assertFalse(cache.seen(key))
+        # "c" rotated "a" and "b" into the previous generation.
+        self.assertEqual(len(cache), 3)
+        self.assertTrue(cache.seen("a"))
+        cache.seen("d")
+        cache.seen("e")
+        self.assertNotIn("a", cache)
+        self.assertIn("c", cache)
+        self.assertLessEqual(len(cache), 2 * cache.capacity)
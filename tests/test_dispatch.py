@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+
+from jcore.dispatch import Dispatcher, EventQueue
+
+
+class DispatcherTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_cancelled_handler_is_accounted(self):
+        queue = EventQueue(10)
+        dispatcher = Dispatcher(max_concurrency=1)
+        started = asyncio.Event()
+
+        async def handler():
+            started.set()
+            await asyncio.sleep(10)
+
+        dispatcher.submit([handler], queue=queue, event="on_privmessage")
+        await started.wait()
+        self.assertEqual(queue.depth, 1)
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+        await asyncio.sleep(0)
+        self.assertEqual(queue.depth, 0)
+        self.assertEqual(dispatcher.active_workers, 0)
+
+
+class EventQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def queue(self, capacity: int, policy: dict = None) -> EventQueue:
+        return EventQueue(capacity, policy, pause=lambda: self.calls.append("pause"), resume=lambda: self.calls.append("resume"))
+
+    def test_events_are_shed_by_importance(self):
+        queue = self.queue(10)
+        self.assertTrue(all(queue.put(None) for _ in range(5)))
+        self.assertFalse(queue.put(None))
+        self.assertFalse(queue.put("on_join"))
+        self.assertTrue(all(queue.put("on_privmessage") for _ in range(5)))
+        self.assertFalse(queue.put("on_privmessage"))
+        self.assertTrue(queue.put("on_command"))
+        self.assertEqual(queue.depth, 11)
+        self.assertEqual(queue.dropped, {"on_raw": 1, "on_join": 1, "on_privmessage": 1})
+        self.assertEqual(queue.total_dropped, 3)
+
+    def test_shed_events_do_not_pause(self):
+        queue = self.queue(4)
+        for _ in range(6):
+            queue.put("on_privmessage")
+        self.assertEqual(queue.depth, 4)
+        self.assertFalse(queue.paused)
+        self.assertEqual(self.calls, [])
+
+    def test_pause_and_resume_at_the_watermarks(self):
+        queue = self.queue(4)
+        for _ in range(3):
+            queue.put("on_command")
+        self.assertFalse(queue.paused)
+        queue.put("on_command", units=2)
+        self.assertTrue(queue.paused)
+        # events that block are still queued while reading is paused.
+        self.assertTrue(queue.put("on_command"))
+        self.assertEqual((queue.depth, queue.pauses, self.calls), (6, 1, ["pause"]))
+        for _ in range(3):
+            queue.task_done()
+        self.assertTrue(queue.paused)
+        queue.task_done()
+        self.assertFalse(queue.paused)
+        self.assertEqual(self.calls, ["pause", "resume"])
+        queue.put("on_command")
+        queue.put("on_command")
+        self.assertEqual((queue.pauses, self.calls), (2, ["pause", "resume", "pause"]))
+
+    def test_policy_overrides(self):
+        queue = self.queue(2, {"on_privmessage": "block", "on_command": "shed_early"})
+        self.assertTrue(queue.put("on_command"))
+        self.assertFalse(queue.put("on_command"))
+        self.assertTrue(queue.put("on_privmessage"))
+        self.assertTrue(queue.paused)
+        self.assertEqual(queue.dropped, {"on_command": 1})
+        with self.assertRaises(ValueError):
+            EventQueue(2, {"on_command": "drop"})
@@ -0,0 +1,100 @@
+import asyncio
+
+import jcore
+
+from support import ClientTestCase, privmsg
+
+
+def suspended(channel: str) -> str:
+    return f"@msg-id=msg_channel_suspended :tmi.twitch.tv NOTICE #{channel} :This channel does not exist or has been suspended."
+
+
+class JoinSchedulerTest(ClientTestCase):
+    channels = ("chana", "chanb")
+
+    async def test_broken_connection_fails_its_joins_only(self):
+        client = jcore.Client(max_connections=2)
+        self.connect(client)
+        broken, working = client.get_socket("chana"), client.get_socket("chanb")
+        broken.transport.close()
+        lost = client.joins.request(broken, "chana")
+        joined = client.joins.request(working, "chanb")
+        self.assertFalse(await asyncio.wait_for(lost, 1))
+        self.assertTrue(await asyncio.wait_for(joined, 1))
+        self.assertEqual((client.joins.joined, client.joins.failed), (1, 1))
+        self.assertEqual(working.transport.lines, ["JOIN #chanb"])
+
+
+class JoinBot(jcore.Client):
+
+    def __init__(self, *args, **kwargs):
+        self.results = []
+        jcore.Client.__init__(self, *args, **kwargs)
+
+    async def on_command(self, message):
+        self.results.append(await message.socket.join_channel("chanc"))
+
+
+class JoinChannelTest(ClientTestCase):
+    channels = ("chana",)
+
+    async def test_dropped_request_returns_false(self):
+        client = JoinBot()
+        self.connect(client)
+        socket = client.get_socket("chana")
+        # spend the join budget so the request is still queued when the socket disconnects.
+        client.joins.bucket.consume(client.joins.bucket.capacity)
+        self.feed(socket, privmsg("chana", "!join"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(client.joins.pending, 1)
+        client.joins.cancel(socket)
+        await self.settle(client)
+        self.assertEqual(client.results, [False])
+        self.assertEqual(socket.events.depth, 0)
+
+    async def test_depart_drops_the_queued_join(self):
+        client = jcore.Client()
+        self.connect(client)
+        socket = client.get_socket("chana")
+        client.joins.bucket.consume(client.joins.bucket.capacity)
+        joining = asyncio.ensure_future(socket.join_channel("chanc"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(client.joins.pending, 1)
+        await socket.depart_channel("chanc")
+        self.assertFalse(await asyncio.wait_for(joining, 1))
+        self.assertEqual(client.joins.pending, 0)
+        self.assertEqual(socket.transport.lines, ["PART #chanc "])
+        self.assertFalse(socket.has_channel("chanc"))
+
+
+class NoticeBot(jcore.Client):
+
+    def __init__(self, *args, **kwargs):
+        self.notices = []
+        jcore.Client.__init__(self, *args, **kwargs)
+
+    async def on_notice(self, message):
+        self.notices.append((message.channel, message.message_id))
+
+
+class SuspendedChannelTest(ClientTestCase):
+    channels = ("chana",)
+
+    async def test_suspended_channel_fails_its_join(self):
+        client = NoticeBot()
+        self.connect(client)
+        socket = client.get_socket("chana")
+        joining = asyncio.ensure_future(socket.join_channel("chanc"))
+        await asyncio.sleep(0.05)
+        self.feed(socket, suspended("chanc"))
+        self.assertFalse(await asyncio.wait_for(joining, 1))
+        self.assertEqual(socket.channels["chanc"].activation_failures, 1000)
+
+    async def test_notice_for_an_untracked_channel(self):
+        client = NoticeBot()
+        self.connect(client)
+        socket = client.get_socket("chana")
+        self.feed(socket, suspended("chanc"))
+        await self.settle(client)
+        self.assertEqual(client.notices, [("chanc", "msg_channel_suspended")])
+        self.assertFalse(socket.has_channel("chanc"))
@@ -0,0 +1,80 @@
+import unittest
+
+from jcore.messageparser import TagSection, parse_line
+
+
+PRIVMSG_TAGS = "badge-info=subscriber/8;badges=subscriber/6,bits/100;color=#0D4200;display-name=Viewer;emotes=25:0-4,12-16;id=b34ccfc7-4977-403a-8a94-33c6ac34fb93;mod=0;room-id=1337;subscriber=1;tmi-sent-ts=1507246572675;turbo=0;user-id=42;user-type="
+
+# (raw line, expected type, expected fields)
+CASES = [
+    (f"@{PRIVMSG_TAGS} :viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #chan :Kappa hello there", "PrivateMessage", {
+        "channel": "chan", "message_text": "Kappa hello there", "display_name": "Viewer", "badges": ["subscriber", "bits"],
+        "badge_info": "subscriber/8", "emotes": ["25:0-4", "12-16"], "id": "b34ccfc7-4977-403a-8a94-33c6ac34fb93",
+        "user_id": "42", "room_id": "1337", "mod": False, "sub": True}),
+    (f"@{PRIVMSG_TAGS} :viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #chan :!Ping me", "CommandMessage", {
+        "channel": "chan", "prefix": "!", "KEYWORD": "ping", "args": ["ping", "me"], "args_len": 2}),
+    # the broadcaster is a moderator of their own channel.
+    ("@badges=broadcaster/1;display-name=Owner;mod=0;room-id=7;user-id=7;tmi-sent-ts=1507246572675 :owner!owner@owner.tmi.twitch.tv PRIVMSG #owner :hi",
+        "PrivateMessage", {"mod": True, "badges": ["broadcaster"], "id": None}),
+    # tag escapes: \s space, \: semicolon, \\ backslash, \r and \n, and a lone trailing backslash is dropped.
+    (r"@badges=;display-name=a\sb;login=c\:d;msg-id=sub;msg-param-sub-plan-name=e\\f;system-msg=g\rh\ni\;room-id=1;user-id=2;tmi-sent-ts=1507246572675 :tmi.twitch.tv USERNOTICE #chan",
+        "SubscriberUserNotice", {"display_name": "a b", "login": "c;d", "sub_plan_name": "e\\f", "system_message": "g\rh\ni", "message_text": None}),
+    ("@badges=;display-name=Sub;login=sub;msg-id=resub;msg-param-cumulative-months=6;msg-param-should-share-streak=1;msg-param-streak-months=2;msg-param-sub-plan=1000;room-id=1;user-id=2;tmi-sent-ts=1507246572675 :tmi.twitch.tv USERNOTICE #chan :Great stream",
+        "SubscriberUserNotice", {"cumulative_months": 6, "share_streak": True, "streak_months": 2, "sub_plan": "1000", "message_text": "Great stream"}),
+    ("@badges=;display-name=Sub;login=sub;msg-id=sub;msg-param-should-share-streak=0;room-id=1;user-id=2;tmi-sent-ts=1507246572675 :tmi.twitch.tv USERNOTICE #chan",
+        "SubscriberUserNotice", {"share_streak": False, "cumulative_months": 0}),
+    ("@badges=;display-name=Raider;login=raider;msg-id=raid;msg-param-displayName=Raider;msg-param-login=raider;msg-param-viewerCount=15;room-id=1;user-id=2;tmi-sent-ts=1507246572675 :tmi.twitch.tv USERNOTICE #chan",
+        "RaidUserNotice", {"raider_login": "raider", "viewer_count": 15}),
+    ("@login=ronni;room-id=;target-msg-id=abc-123-def;tmi-sent-ts=1642720582342 :tmi.twitch.tv CLEARMSG #dallas :HeyGuys",
+        "ClearMessage", {"channel": "dallas", "login": "ronni", "target_message_id": "abc-123-def", "message": "HeyGuys"}),
+    ("@ban-duration=600;room-id=12345678;target-user-id=87654321;tmi-sent-ts=1642715756806 :tmi.twitch.tv CLEARCHAT #dallas :ronni",
+        "ClearChat", {"channel": "dallas", "ban_duration": "600"}),
+    ("@room-id=12345678;tmi-sent-ts=1642715695392 :tmi.twitch.tv CLEARCHAT #dallas", "ClearChat", {"channel": "dallas", "ban_duration": None}),
+    (":bot.tmi.twitch.tv 353 bot = #chan :bot", "Names", {"channel": "chan"}),
+    (":bot.tmi.twitch.tv 366 bot #chan :End of /NAMES list", "Names", {"channel": "chan"}),
+    ("@msg-id=msg_banned :tmi.twitch.tv NOTICE #chan :You are permanently banned from talking in chan.",
+        "Notice", {"channel": "chan", "message_id": "msg_banned"}),
+    ("@badge-info=;badges=moderator/1;color=;display-name=Bot;emote-sets=0,33;mod=1;subscriber=0;user-type=mod :tmi.twitch.tv USERSTATE #chan",
+        "UserState", {"channel": "chan", "mod": True, "badges": ["moderator"], "emote_set": ["0", "33"]}),
+    ("@emote-only=0;followers-only=10;r9k=0;room-id=1;slow=30;subs-only=1 :tmi.twitch.tv ROOMSTATE #chan",
+        "RoomState", {"channel": "chan", "follower_only": True, "slow": 30, "subs_only": True, "emote_only": False}),
+    ("@badges=;color=;display-name=Alice;emotes=;message-id=1;thread-id=11_22;turbo=0;user-id=11;user-type= :alice!alice@alice.tmi.twitch.tv WHISPER bot :psst",
+        "Whisper", {"display_name": "Alice", "id": "1", "thread_id": "11_22", "user_id": "11", "message_text": "psst"}),
+    # lines without tags.
+    (":bob!bob@bob.tmi.twitch.tv JOIN #chan", "Join", {"channel": "chan", "user": "bob"}),
+    (":bob!bob@bob.tmi.twitch.tv PART #chan", "Part", {"channel": "chan", "user": "bob"}),
+    (":tmi.twitch.tv RECONNECT", "Reconnect", {"channel": None}),
+    # lines without a prefix.
+    ("RECONNECT", "Reconnect", {"channel": None}),
+    ("PING :tmi.twitch.tv", "RawMessage", {"line": "PING :tmi.twitch.tv"}),
+    ("@badges= :tmi.twitch.tv CAP * ACK :twitch.tv/tags", "RawMessage", {}),
+]
+
+
+class ParseLineTest(unittest.TestCase):
+
+    def test_lines(self):
+        for lazy in (False, True):
+            for line, inner, fields in CASES:
+                with self.subTest(line=line, lazy=lazy):
+                    message = parse_line(line, "!", lazy)
+                    self.assertEqual(message.inner, inner)
+                    for name, value in fields.items():
+                        self.assertEqual(getattr(message, name), value, name)
+
+    def test_lazy_messages_keep_no_tag_dictionary(self):
+        message = parse_line(f"@{PRIVMSG_TAGS} :viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #chan :hello", "!", True)
+        self.assertIsInstance(message._tags, TagSection)
+        self.assertIs(message._tags.line, message.line)
+        self.assertEqual(message._tags.get("room-id"), "1337")
+        self.assertEqual(message._tags.get("missing", "default"), "default")
+
+    def test_trailing_line_ending(self):
+        message = parse_line(f"@{PRIVMSG_TAGS} :viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #chan :hello\r\n", "!")
+        self.assertEqual((message.channel, message.message_text), ("chan", "hello"))
+
+    def test_command_prefixes(self):
+        line = f"@{PRIVMSG_TAGS} :viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #chan :??so bob"
+        message = parse_line(line, ("??", "!"))
+        self.assertEqual((message.inner, message.prefix, message.KEYWORD), ("CommandMessage", "??", "so"))
+        self.assertEqual(parse_line(line, "!").inner, "PrivateMessage")
@@ -0,0 +1,99 @@
+import asyncio
+from unittest import mock
+
+import jcore
+from jcore.backoff import Backoff
+
+from support import ClientTestCase, FakeConnections, privmsg, roomstate
+
+
+class ChatBot(jcore.Client):
+
+    def __init__(self, *args, **kwargs):
+        self.chat = []
+        jcore.Client.__init__(self, *args, **kwargs)
+
+    async def on_privmessage(self, message):
+        self.chat.append(message.message_text)
+
+
+class ReplaceConnectionTest(ClientTestCase):
+    channels = ("chana", "chanb")
+
+    async def asyncSetUp(self):
+        self.connections = FakeConnections()
+        self.client = ChatBot(transport=self.connections)
+        self.socket = self.client.get_socket("chana")
+        await self.client.start_socket(self.socket)
+        self.current, = self.connections.opened
+        await asyncio.sleep(0.05)
+        self.current.receive(*[roomstate(channel) for channel in self.socket.channel_list])
+        self.assertEqual(self.socket.inactive_connections, [])
+
+    async def asyncTearDown(self):
+        await self.socket.disconnect()
+
+    async def request_reconnect(self):
+        with mock.patch("jcore.jsocket.RECONNECT_NOTICE_SPREAD", 0):
+            self.current.receive(":tmi.twitch.tv RECONNECT")
+            await asyncio.sleep(0.05)
+        return self.connections.opened[-1]
+
+    async def test_replacement_takes_over_once_the_channels_are_joined(self):
+        replacement = await self.request_reconnect()
+        self.assertIsNot(replacement, self.current)
+        self.assertEqual(replacement.lines[-1], "JOIN #testbot,#chana,#chanb")
+        # messages with an id arriving on both connections are processed once.
+        self.current.receive(privmsg("chana", "hello", message_id="1"))
+        replacement.receive(privmsg("chana", "hello", message_id="1"))
+        replacement.receive(*[roomstate(channel) for channel in self.socket.channel_list])
+        await asyncio.sleep(0.05)
+        self.assertIs(self.socket.transport, replacement)
+        self.assertTrue(self.current.closed)
+        self.current.receive(privmsg("chana", "late", message_id="2"))
+        replacement.receive(privmsg("chana", "world", message_id="3"))
+        await self.settle(self.client)
+        self.assertEqual(self.client.chat, ["hello", "world"])
+        self.assertEqual(self.socket.inactive_connections, [])
+
+    async def test_unconfirmed_channels_are_joined_once(self):
+        # spend the join budget so the JOIN requests of the replacement connection are still queued.
+        self.client.joins.bucket.consume(self.client.joins.bucket.tokens)
+        replacement = await self.request_reconnect()
+        self.assertEqual(self.client.joins.pending, 3)
+
+        # the server closes the old connection before the channels are confirmed on the new one.
+        self.current.close()
+        await asyncio.sleep(0.05)
+        self.assertIs(self.socket.transport, replacement)
+        self.assertEqual(self.client.joins.pending, 3)
+        self.assertEqual(sorted(self.socket.inactive_connections), ["chana", "chanb", "testbot"])
+        self.assertFalse(any(line.startswith("JOIN") for line in replacement.lines))
+
+
+class StartSocketTest(ClientTestCase):
+    channels = ("chana",)
+
+    async def test_first_connection_is_retried(self):
+        connections = FakeConnections(refuse=2)
+        client = jcore.Client(transport=connections)
+        socket = client.get_socket("chana")
+        socket.backoff = Backoff(base=0.01)
+        await client.start_socket(socket)
+        self.assertIsNone(socket.transport)
+        await asyncio.sleep(0.2)
+        self.assertEqual(connections.attempts, 3)
+        self.assertIs(socket.transport, connections.opened[0])
+        self.assertEqual(socket.backoff.attempts, 2)
+        self.assertEqual(socket.transport.lines[-1], "JOIN #testbot,#chana")
+        await socket.disconnect()
+
+    async def test_disconnect_stops_the_retries(self):
+        connections = FakeConnections(refuse=10)
+        client = jcore.Client(transport=connections)
+        socket = client.get_socket("chana")
+        socket.backoff = Backoff(base=0.05)
+        await client.start_socket(socket)
+        await socket.disconnect()
+        await asyncio.sleep(0.1)
+        self.assertEqual(connections.attempts, 1)
@@ -0,0 +1,126 @@
+import asyncio
+import unittest
+
+from jcore.scheduler import Scheduler
+
+
+class FakeHandle():
+
+    def __init__(self, when: float, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeLoop():
+    """Stands in for the event loop of a `Scheduler`, time only moves when the test advances it.
+    Tasks are run on the real event loop."""
+
+    def __init__(self, now: float = 1000):
+        self.now = now
+        self.handle = None
+
+    def time(self) -> float:
+        return self.now
+
+    def call_at(self, when: float, callback) -> FakeHandle:
+        self.handle = FakeHandle(when, callback)
+        return self.handle
+
+    def create_task(self, coroutine) -> asyncio.Task:
+        return asyncio.get_running_loop().create_task(coroutine)
+
+    def advance(self, seconds: float):
+        """Move the clock forward, and run the wakeup armed by the scheduler if it is due."""
+        self.now += seconds
+        handle = self.handle
+        if handle is not None and not handle.cancelled and handle.when <= self.now:
+            self.handle = None
+            handle.callback()
+
+
+class SchedulerTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.loop = FakeLoop()
+        self.scheduler = Scheduler(self.loop)
+        self.calls = []
+
+    def test_deadlines_run_in_order(self):
+        for delay, name in ((3, "c"), (1, "a"), (2, "b"), (1, "a2")):
+            self.scheduler.call_later(delay, self.calls.append, name)
+        self.assertEqual(self.scheduler.pending, 4)
+        # only the earliest deadline is armed.
+        self.assertEqual(self.loop.handle.when, 1001)
+        self.loop.advance(5)
+        self.assertEqual(self.calls, ["a", "a2", "b", "c"])
+        self.assertEqual(self.scheduler.pending, 0)
+        self.assertIsNone(self.loop.handle)
+
+    def test_earlier_timer_rearms(self):
+        self.scheduler.call_later(5, self.calls.append, "late")
+        armed = self.loop.handle
+        self.scheduler.call_later(1, self.calls.append, "early")
+        self.assertTrue(armed.cancelled)
+        self.loop.advance(1)
+        self.assertEqual(self.calls, ["early"])
+        self.assertEqual(self.loop.handle.when, 1005)
+
+    def test_failing_callback_does_not_stop_the_others(self):
+        self.scheduler.call_later(1, lambda: 1 / 0)
+        self.scheduler.call_later(1, self.calls.append, "after")
+        with self.assertLogs("jcore.scheduler"):
+            self.loop.advance(1)
+        self.assertEqual(self.calls, ["after"])
+
+    def test_missed_deadlines_are_overruns(self):
+        timer = self.scheduler.call_every(10, self.calls.append, "tick")
+        self.loop.advance(10)
+        self.assertEqual((timer.runs, timer.overruns), (1, 0))
+        # the loop was busy for two and a half intervals.
+        self.loop.advance(35)
+        self.assertEqual((timer.runs, timer.overruns), (2, 2))
+        self.assertEqual(timer.deadline, 1050)
+        self.loop.advance(5)
+        self.assertEqual((timer.runs, timer.overruns), (3, 2))
+
+    async def test_run_is_skipped_while_the_previous_one_is_running(self):
+        release = asyncio.Event()
+
+        async def job():
+            self.calls.append("start")
+            await release.wait()
+
+        timer = self.scheduler.call_every(10, job)
+        self.loop.advance(10)
+        await asyncio.sleep(0)
+        self.loop.advance(10)
+        await asyncio.sleep(0)
+        self.assertEqual(self.calls, ["start"])
+        self.assertEqual((timer.runs, timer.overruns), (1, 1))
+        release.set()
+        await timer.task
+        self.loop.advance(10)
+        await asyncio.sleep(0)
+        self.assertEqual(self.calls, ["start", "start"])
+        self.assertEqual((timer.runs, timer.overruns), (2, 1))
+        await timer.task
+
+    def test_cancelled_timers_are_not_run(self):
+        once = self.scheduler.call_later(1, self.calls.append, "once")
+        every = self.scheduler.call_every(1, self.calls.append, "every")
+        self.scheduler.call_later(2, self.calls.append, "kept")
+        once.cancel()
+        every.cancel()
+        self.loop.advance(1)
+        self.assertEqual(self.scheduler.pending, 1)
+        self.loop.advance(1)
+        self.assertEqual(self.calls, ["kept"])
+        self.assertEqual((once.runs, every.runs), (0, 0))
+
+    def test_interval_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            self.scheduler.call_every(0, self.calls.append)
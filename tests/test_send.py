@@ -0,0 +1,60 @@
+import asyncio
+
+import jcore
+
+from support import ClientTestCase, privmsg
+
+
+class ReplyBot(jcore.Client):
+
+    def __init__(self, *args, **kwargs):
+        self.replies = []
+        self.chat = {}
+        jcore.Client.__init__(self, *args, **kwargs)
+
+    async def on_command(self, message):
+        self.replies.append(await message.send(f"reply to {message.message_text}"))
+
+    async def on_privmessage(self, message):
+        self.chat[message.channel] = asyncio.get_running_loop().time()
+
+
+class SendTest(ClientTestCase):
+    channels = ("chana", "chanb")
+
+    async def test_replies_do_not_hold_workers(self):
+        # 8 replies to #chana wait up to 8 s for its 1 message/s limit, which must not delay #chanb.
+        client = ReplyBot(max_concurrency=5)
+        self.connect(client)
+        socket = client.get_socket("chana")
+        started = asyncio.get_running_loop().time()
+        self.feed(socket, *[privmsg("chana", f"!cmd {i}") for i in range(8)])
+        self.feed(socket, privmsg("chanb", "hello"))
+        await self.settle(client)
+        self.assertLess(client.chat["chanb"] - started, 0.5)
+        self.assertEqual(len(client.replies), 8)
+        self.assertTrue(await client.replies[0])
+        self.assertEqual(client.outbound.pending, 7)
+        self.assertEqual(socket.transport.lines, ["PRIVMSG #chana :reply to !cmd 0"])
+
+    async def test_broken_connection_fails_its_sends_only(self):
+        client = ReplyBot(max_connections=2)
+        self.connect(client)
+        broken, working = client.get_socket("chana"), client.get_socket("chanb")
+        self.assertIsNot(broken, working)
+        broken.transport.close()
+        lost = broken.send("chana", "lost")
+        delivered = working.send("chanb", "delivered")
+        self.assertFalse(await asyncio.wait_for(lost, 1))
+        self.assertTrue(await asyncio.wait_for(delivered, 1))
+        self.assertEqual((client.outbound.sent, client.outbound.failed), (1, 1))
+        self.assertEqual(working.transport.lines, ["PRIVMSG #chanb :delivered"])
+
+    async def test_send_to_channel_returns_without_waiting(self):
+        client = ReplyBot()
+        self.connect(client)
+        first = await client.send_to_channel("chana", "one")
+        second = await client.send_to_channel("chana", "two")
+        self.assertTrue(await first)
+        self.assertFalse(second.done())
+        self.assertFalse(await (await client.send_to_channel("unknown", "lost")))
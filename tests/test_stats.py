@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+
+from jcore.stats import RateWindow
+
+from support import FakeClock
+
+
+class RateWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("jcore.stats.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_seconds_roll_out_of_the_window(self):
+        window = RateWindow(size=10)
+        window.hit(5)
+        self.clock.advance(9)
+        window.hit()
+        self.assertEqual(window.count, 6)
+        self.clock.advance(1)
+        self.assertEqual(window.count, 1)
+        self.clock.advance(0.5)
+        window.hit(2)
+        self.assertEqual(window.count, 3)
+        self.clock.advance(10)
+        self.assertEqual(window.count, 0)
+        self.assertEqual(window.age, 20.5)
+
+    def test_bucket_is_reused_after_a_full_lap(self):
+        window = RateWindow(size=10)
+        window.hit(3)
+        self.clock.advance(10)
+        window.hit()
+        self.assertEqual((window.count, window.peak), (1, 1))
+
+    def test_rate_and_peak(self):
+        window = RateWindow(size=10)
+        for _ in range(5):
+            window.hit()
+        self.clock.advance(1)
+        window.hit(3)
+        self.clock.advance(1)
+        window.hit(2)
+        self.assertEqual(window.rate, 1)
+        self.assertEqual(window.peak, 5)
+        self.assertEqual(window.burstiness, 5)
+
+    def test_burstiness_after_idle_gaps(self):
+        window = RateWindow(size=10)
+        for second in range(10):
+            if second:
+                self.clock.advance(1)
+            window.hit()
+        self.assertEqual(window.burstiness, 1)
+        # half the window idle, then a burst.
+        self.clock.advance(5)
+        window.hit(5)
+        self.assertEqual(window.count, 10)
+        self.assertEqual(window.burstiness, 5)
+        # idle for longer than the window.
+        self.clock.advance(10)
+        self.assertEqual(window.burstiness, 0)
+        self.assertEqual(window.peak, 0)